@@ -0,0 +1,289 @@
+"""Benchmarks for steamworksparser that run against a synthetic SDK
+
+Usage: python benchmark.py {memory,throughput} [--files N] [--scale N] [--seed N] [--folder PATH]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    from . import steamworksparser
+    from . import syntheticsdk
+except ImportError:
+    import steamworksparser
+    import syntheticsdk
+
+# The model classes that used to carry a per instance __dict__.
+g_ModelClasses = (
+    "Arg",
+    "ArgAttribute",
+    "Function",
+    "FunctionAttribute",
+    "EnumField",
+    "StructField",
+    "Comment",
+    "LazyComment",
+    "Constant",
+    "Define",
+    "Typedef",
+    "BlankLine",
+)
+
+def get_rss():
+    """Returns the current resident set size in bytes, or None if it can't be determined"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm") as infile:
+            return int(infile.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def iter_model(parser):
+    for f in parser.files:
+        for d in f.defines:
+            yield d
+            yield d.c
+        for c in f.constants:
+            yield c
+            yield c.c
+        for e in f.enums:
+            yield e.c
+            yield e.endcomments
+            for field in e.fields:
+                yield field
+                yield field.c
+        for s in f.structs + f.callbacks:
+            yield s.c
+            yield s.endcomments
+            for field in s.fields:
+                yield field
+                yield field.c
+        for i in f.interfaces:
+            yield i.c
+            for func in i.functions:
+                yield func
+                for a in func.attributes:
+                    yield a
+                for a in func.args:
+                    yield a
+                    yield a.attribute
+        for t in f.typedefs:
+            yield t
+            yield t.c
+
+def get_entity_sizes(parser):
+    sizes = {}
+    seen = set()
+    for o in iter_model(parser):
+        if o is None or id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, steamworksparser.LazyComment) and o.source is not None:
+            # Not materialized, the comments are only in the SourceText which is counted once per file.
+            if id(o.source) not in seen:
+                seen.add(id(o.source))
+                count, total = sizes.get("SourceText", (0, 0))
+                sizes["SourceText"] = (count + 1, total + sys.getsizeof(o.source) + sys.getsizeof(o.source.text) + sys.getsizeof(o.source.openlines))
+        elif isinstance(o, steamworksparser.Comment):
+            for r in o.rawprecomments:
+                if isinstance(r, steamworksparser.BlankLine) and id(r) not in seen:
+                    seen.add(id(r))
+                    count, total = sizes.get("BlankLine", (0, 0))
+                    sizes["BlankLine"] = (count + 1, total + sys.getsizeof(r) + get_dict_size(r))
+
+        name = type(o).__name__
+        count, total = sizes.get(name, (0, 0))
+        sizes[name] = (count + 1, total + sys.getsizeof(o) + get_dict_size(o))
+    return sizes
+
+def get_string_sizes(parser):
+    """Returns (number of str objects, their total size) used for types, attribute names and #if conditions"""
+    strings = {}
+    for o in iter_model(parser):
+        if isinstance(o, steamworksparser.Function):
+            values = [o.returntype, o.ifstatements]
+        elif isinstance(o, (steamworksparser.FunctionAttribute, steamworksparser.ArgAttribute)):
+            values = [o.name]
+        elif isinstance(o, (steamworksparser.Arg, steamworksparser.StructField, steamworksparser.Typedef, steamworksparser.Constant)):
+            values = [o.type]
+        else:
+            continue
+        for v in values:
+            if isinstance(v, str):
+                strings[id(v)] = sys.getsizeof(v)
+    return len(strings), sum(strings.values())
+
+def get_dict_size(o):
+    d = getattr(o, "__dict__", None)
+    if d is None:
+        return 0
+    return sys.getsizeof(d)
+
+def use_dict_classes():
+    # Recreates the old layout by subclassing each model class without __slots__, which adds a __dict__.
+    for name in g_ModelClasses:
+        cls = getattr(steamworksparser, name)
+        setattr(steamworksparser, name, type(name, (cls,), {}))
+
+def run_memory_child(folder, mode):
+    if mode == "dict":
+        use_dict_classes()
+    if mode != "interned":
+        steamworksparser.intern_strings = lambda f, strings: None
+
+    before = get_rss()
+    parser = steamworksparser.parse(folder)
+    after = get_rss()
+
+    return {
+        "mode": mode,
+        "rss_before": before,
+        "rss_after": after,
+        "entities": get_entity_sizes(parser),
+        "strings": get_string_sizes(parser),
+    }
+
+def bench_memory(folder):
+    results = []
+    for mode in ("dict", "slots", "interned"):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "memory-child", "--folder", folder, "--mode", mode])
+        results.append(json.loads(output))
+
+    for r in results:
+        print("[%s]" % r["mode"])
+        if r["rss_before"] is not None:
+            print("    RSS before parse: %10.1f MiB" % (r["rss_before"] / 1048576.0))
+            print("    RSS after parse:  %10.1f MiB" % (r["rss_after"] / 1048576.0))
+            print("    RSS delta:        %10.1f MiB" % ((r["rss_after"] - r["rss_before"]) / 1048576.0))
+        totalbytes = 0
+        for name in sorted(r["entities"]):
+            count, total = r["entities"][name]
+            totalbytes += total
+            print("    %-18s %8d x %5.1f bytes" % (name, count, float(total) / count))
+        print("    Entity total:     %10.1f MiB" % (totalbytes / 1048576.0))
+        count, total = r["strings"]
+        print("    Type strings:     %10.1f MiB in %d str objects" % (total / 1048576.0, count))
+
+def count_lines(folder):
+    total = 0
+    for name in os.listdir(folder):
+        if name.endswith(".h") and name not in steamworksparser.g_SkippedFiles:
+            with open(os.path.join(folder, name), "rb") as infile:
+                total += infile.read().count(b"\n")
+    return total
+
+def get_entity_counts(parser):
+    counts = {
+        "files": len(parser.files),
+        "defines": 0,
+        "constants": 0,
+        "enums": 0,
+        "enum fields": 0,
+        "structs": 0,
+        "struct fields": 0,
+        "callbacks": 0,
+        "interfaces": 0,
+        "functions": 0,
+        "args": 0,
+        "typedefs": len(parser.typedefs),
+    }
+    for f in parser.files:
+        counts["defines"] += len(f.defines)
+        counts["constants"] += len(f.constants)
+        counts["enums"] += len(f.enums)
+        counts["enum fields"] += sum(len(e.fields) for e in f.enums)
+        counts["structs"] += len(f.structs)
+        counts["callbacks"] += len(f.callbacks)
+        counts["struct fields"] += sum(len(s.fields) for s in f.structs + f.callbacks)
+        counts["interfaces"] += len(f.interfaces)
+        for i in f.interfaces:
+            counts["functions"] += len(i.functions)
+            counts["args"] += sum(len(func.args) for func in i.functions)
+    return counts
+
+def get_max_rss():
+    """Returns the peak resident set size of this process in bytes, or None if it can't be determined"""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return maxrss
+    return maxrss * 1024
+
+def bench_throughput(folder, repeat=5, workers=None):
+    numlines = count_lines(folder)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser = steamworksparser.parse(folder, workers)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+
+    numfiles = len(parser.files)
+    counts = get_entity_counts(parser)
+    del parser
+
+    # Traced separately, tracemalloc slows everything down.
+    tracemalloc.start()
+    steamworksparser.parse(folder, workers)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print("Lines:           %d" % numlines)
+    print("Files:           %d" % numfiles)
+    print("Best time:       %.3f s (of %d)" % (best, repeat))
+    print("Lines/sec:       %.0f" % (numlines / best))
+    print("Files/sec:       %.1f" % (numfiles / best))
+    print("Peak allocated:  %.1f MiB" % (peak / 1048576.0))
+    maxrss = get_max_rss()
+    if maxrss is not None:
+        print("Peak RSS:        %.1f MiB" % (maxrss / 1048576.0))
+    print("Entities:")
+    for name, count in counts.items():
+        print("    %-14s %8d" % (name, count))
+
+def main():
+    argparser = argparse.ArgumentParser(description="steamworksparser benchmarks")
+    argparser.add_argument("benchmark", choices=("memory", "memory-child", "throughput"))
+    argparser.add_argument("--files", type=int, default=40, help="Number of synthetic headers")
+    argparser.add_argument("--scale", type=int, default=200, help="Entities of each kind per header")
+    argparser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic SDK")
+    argparser.add_argument("--folder", help="Use an existing folder of headers instead of a synthetic SDK")
+    argparser.add_argument("--mode", choices=("dict", "slots", "interned"), default="interned")
+    argparser.add_argument("--repeat", type=int, default=5, help="Number of timed runs, the best one is reported")
+    argparser.add_argument("--workers", type=int, help="Parse in a pool of this many processes")
+    args = argparser.parse_args()
+
+    if args.benchmark == "memory-child":
+        print(json.dumps(run_memory_child(args.folder, args.mode)))
+        return
+
+    benchmarks = {
+        "memory": bench_memory,
+        "throughput": lambda folder: bench_throughput(folder, args.repeat, args.workers),
+    }
+
+    if args.folder:
+        benchmarks[args.benchmark](args.folder)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        syntheticsdk.write_sdk(folder, args.files, args.scale, args.seed)
+        benchmarks[args.benchmark](folder)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""Keeps a parsed SDK resident and serves it over a Unix socket, see ParseServer and ParseClient
+
+Usage: python parsedaemon.py serve FOLDER [--socket PATH] [--interval SECONDS] [--timeout SECONDS]
+                               [--workers N] [--cache PATH]
+       python parsedaemon.py {status,dump,file,interface,struct} [NAME] [--socket PATH] [--format FORMAT]
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+
+try:
+    from . import steamworksparser
+except ImportError:
+    import steamworksparser
+
+class ServerError(Exception):
+    pass
+
+# Request op -> ParseServer method answering it.
+g_ServerRequests = {
+    "status": "request_status",
+    "dump": "request_dump",
+    "file": "request_file",
+    "interface": "request_interface",
+    "struct": "request_struct",
+}
+
+class _ParseRequestHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        # Requests are answered one at a time, so a client which stalls mustn't hold up the others for long.
+        self.timeout = self.server.requesttimeout
+        socketserver.StreamRequestHandler.setup(self)
+
+    def handle(self):
+        try:
+            line = self.rfile.readline()
+            # Connections which close without a request are only checking if the server is up.
+            if line:
+                self.server.respond(line, self.wfile)
+        except OSError:
+            # Timed out, or the client went away.
+            pass
+
+class ParseServer(socketserver.UnixStreamServer):
+    """Keeps a Parser resident and answers queries about it over a Unix socket, see serve and ParseClient
+
+    Each connection sends one request, a JSON object on a single line like {"op": "struct", "name": "..."},
+    and gets back a JSON status line followed by the payload, up to the end of the connection.
+    Requests are answered one at a time, a client gets requesttimeout seconds to send its request and take
+    the response. Headers are checked for changes before each request and every interval seconds while idle,
+    and the changed ones are re-parsed with Parser.reparse. If that fails the last good model is still served,
+    the error is reported by status requests and the headers are re-parsed again on the next check."""
+
+    def __init__(self, parser, path, interval=1.0, requesttimeout=5.0):
+        self.parser = parser
+        self.interval = interval
+        self.requesttimeout = requesttimeout
+        self.generation = 0  # Bumped whenever headers are re-parsed
+        self.dumps = {}  # Format -> bytes written by export_model, for the current generation
+        self.error = None  # Why the last re-parse failed, None once the headers parse again
+        _remove_stale_socket(path)
+        socketserver.UnixStreamServer.__init__(self, path, _ParseRequestHandler)
+
+    def serve_forever(self, poll_interval=None):
+        if poll_interval is None:
+            poll_interval = self.interval
+        socketserver.UnixStreamServer.serve_forever(self, poll_interval)
+
+    def service_actions(self):
+        # Called by serve_forever between requests and whenever it has been idle for the poll interval.
+        self.refresh()
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+    def refresh(self):
+        """Re-parses the headers which changed since they were last parsed, returns the re-parsed SteamFiles
+
+        Failures are kept in self.error rather than raised, so that they don't stop serve_forever."""
+        paths = []
+        try:
+            paths = self.parser.get_changed_files()
+            if not paths:
+                # Also the case when a header which failed to parse was deleted.
+                self.error = None
+                return []
+            changed = self.parser.reparse(paths)
+        except Exception as e:
+            # A header may be half written while it's being saved, so this is retried on the next check.
+            self.error = "Couldn't re-parse %s: %s: %s" % (", ".join(sorted(paths)) or self.parser.folder, type(e).__name__, e)
+            return []
+        self.error = None
+        self.generation += 1
+        self.dumps = {}
+        return changed
+
+    def respond(self, line, wfile):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            method = g_ServerRequests.get(request.get("op"))
+            if method is None:
+                raise ValueError("Unknown request: %s" % request.get("op"))
+            self.refresh()
+            payload = getattr(self, method)(request)
+            status = {"generation": self.generation}
+        except (ValueError, ImportError) as e:
+            payload = b""
+            status = {"error": str(e)}
+        except Exception as e:
+            payload = b""
+            status = {"error": "%s: %s" % (type(e).__name__, e)}
+
+        wfile.write(json.dumps(status).encode() + b"\n")
+        wfile.write(payload)
+
+    def request_status(self, request):
+        files = [f.name for f in self.parser.files]
+        return _encode_compact({"folder": self.parser.folder, "pid": os.getpid(), "files": files, "error": self.error})
+
+    def request_dump(self, request):
+        fmt = request.get("format", "json")
+        dump = self.dumps.get(fmt)
+        if dump is None:
+            if fmt == "json":
+                out = io.StringIO()
+                steamworksparser.export_model(self.parser, out, fmt)
+                dump = out.getvalue().encode()
+            else:
+                out = io.BytesIO()
+                steamworksparser.export_model(self.parser, out, fmt)
+                dump = out.getvalue()
+            self.dumps[fmt] = dump
+        return dump
+
+    def request_file(self, request):
+        f = self.parser.index.files.get(_get_request_name(request))
+        return _encode_compact(steamworksparser._to_data(f, steamworksparser.SteamFile))
+
+    def request_interface(self, request):
+        interface = self.parser.index.interfaces.get(_get_request_name(request))
+        return _encode_compact(steamworksparser._to_data(interface, steamworksparser.Interface))
+
+    def request_struct(self, request):
+        index = self.parser.index
+        name = _get_request_name(request)
+        struct = index.structs.get(name) or index.callbacks.get(name)
+        return _encode_compact(steamworksparser._to_data(struct, steamworksparser.Struct))
+
+def _get_request_name(request):
+    name = request.get("name")
+    if not isinstance(name, str):
+        raise ValueError("Request needs a name")
+    return name
+
+def _encode_compact(data):
+    return json.dumps(data, separators=(",", ":")).encode()
+
+def _remove_stale_socket(path):
+    # A socket file left behind by a server that didn't shut down cleanly would make the bind fail.
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)
+            return
+    raise ServerError("A server is already listening on " + path)
+
+class ParseClient:
+    """Queries a ParseServer, each call makes one connection so instances are cheap and can be kept around"""
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, op, **args):
+        """Sends a request and returns its payload as bytes, raises ServerError if the server refused it"""
+        args["op"] = op
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            sock.sendall(json.dumps(args).encode() + b"\n")
+            with sock.makefile("rb") as response:
+                status = json.loads(response.readline() or "null")
+                payload = response.read()
+
+        if not isinstance(status, dict):
+            raise ServerError("No response from " + self.path)
+        if "error" in status:
+            raise ServerError(status["error"])
+        return payload
+
+    def status(self):
+        """Returns the folder, pid and file names of the server, and why its last re-parse failed or None"""
+        return json.loads(self.request("status"))
+
+    def dump(self, format="json"):
+        """Returns the whole model as written by export_model, see load"""
+        return self.request("dump", format=format)
+
+    def load(self, format="json"):
+        """Returns the whole model as a Parser, see load_model"""
+        data = self.dump(format)
+        if format == "json":
+            return steamworksparser.load_model(io.StringIO(data.decode()), format)
+        return steamworksparser.load_model(io.BytesIO(data), format)
+
+    def get_file(self, name):
+        """Returns the SteamFile with that name, or None"""
+        return steamworksparser._from_data(json.loads(self.request("file", name=name)), steamworksparser.SteamFile)
+
+    def get_interface(self, name):
+        """Returns the Interface with that name, or None"""
+        return steamworksparser._from_data(json.loads(self.request("interface", name=name)), steamworksparser.Interface)
+
+    def get_struct(self, name):
+        """Returns the struct or callback Struct with that name, or None"""
+        return steamworksparser._from_data(json.loads(self.request("struct", name=name)), steamworksparser.Struct)
+
+def serve(folder, path, interval=1.0, workers=None, cache=None, requesttimeout=5.0):
+    """Parses folder and serves it on the Unix socket path until interrupted, see ParseServer and ParseClient
+
+    workers and cache are the same as for steamworksparser.parse."""
+    server = ParseServer(steamworksparser.parse(folder, workers, cache), path, interval, requesttimeout)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def main():
+    argparser = argparse.ArgumentParser(description="steamworksparser daemon")
+    argparser.add_argument("command", choices=("serve",) + tuple(g_ServerRequests))
+    argparser.add_argument("name", nargs="?", help="The folder to serve, or the name to look up")
+    argparser.add_argument("--socket", default="steamworksparser.sock", help="Path of the Unix socket")
+    argparser.add_argument("--interval", type=float, default=1.0, help="Seconds between checks for changed headers")
+    argparser.add_argument("--workers", type=int, help="Parse in a pool of this many processes")
+    argparser.add_argument("--cache", help="Directory of a ParseCache")
+    argparser.add_argument("--timeout", type=float, default=5.0, help="Seconds a client gets to make its request")
+    argparser.add_argument("--format", choices=("json", "msgpack"), default="json", help="Format of dumps")
+    args = argparser.parse_args()
+
+    if args.command == "serve":
+        if not args.name:
+            argparser.error("serve needs a folder")
+        # Stopping the daemon shouldn't leave the socket file behind.
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            serve(args.name, args.socket, args.interval, args.workers, args.cache, args.timeout)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    client = ParseClient(args.socket)
+    try:
+        if args.command == "status":
+            print(json.dumps(client.status(), indent=4))
+        elif args.command == "dump":
+            sys.stdout.buffer.write(client.dump(args.format))
+        else:
+            if not args.name:
+                argparser.error(args.command + " needs a name")
+            sys.stdout.buffer.write(client.request(args.command, name=args.name) + b"\n")
+    except ServerError as e:
+        sys.exit(str(e))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,18 @@
 import os
+import array
+import asyncio
 import codecs
-import copy
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import operator
+import pickle
 import re
+import time
+
+# Bump whenever a change alters the parsed model, this invalidates ParseCache entries.
+PARSER_VERSION = 10
 
 g_SkippedFiles = (
     "steam_api_flat.h", # Valve's C API
@@ -33,6 +44,8 @@ g_SkippedLines = (
     "STEAM_DEFINE_INTERFACE_ACCESSOR",
 )
 
+g_SkippedLinesRegex = re.compile("|".join(re.escape(skip) for skip in g_SkippedLines))
+
 g_SkippedStructs = (
     # steamnetworkingtypes.h
     "SteamNetworkingIPAddr",
@@ -80,30 +93,155 @@ g_GameServerInterfaces = (
     'isteamutils.h',
 )
 
+# Compiled once at import, these run for nearly every line.
+g_ConstantRegex = re.compile(r".*const\s+(.*)\s+(\w+)\s+=\s+(.*);$")
+g_EnumConstantRegex = re.compile(r"^enum { (.*) = (.*) };")
+g_EnumFieldRegex = re.compile(r"^(\w+,?)([ \t]*)=?([ \t]*)(.*)$")
+g_StructFieldRegex = re.compile(r"^([^=.]*\s\**)(\w+);$")
+g_StructArrayFieldRegex = re.compile(r"^(.*\s\*?)(\w+)\[\s*(\w+)?\s*\];$")
+g_CallbackMemberArrayRegex = re.compile(r"^STEAM_CALLBACK_MEMBER_ARRAY\(.*,\s+(.*?)\s*,\s*(\w*)\s*,\s*(\d*)\s*\)")
+g_CallbackMemberRegex = re.compile(r"^STEAM_CALLBACK_MEMBER\(.*,\s+(.*?)\s*,\s*(\w*)\[?(\d+)?\]?\s*\)")
+g_ConditionalRegex = re.compile(r"#\s*(if|ifdef|ifndef|elif|else|endif|define|undef)\b\s*(.*)")
+g_DefineNameRegex = re.compile(r"(\w*)(?:\([^)]*\))?(.*)")
+g_CallbackBeginRegex = re.compile(r"^STEAM_CALLBACK_BEGIN\(\s?(\w+),\s?(.*?)\s*\)")
+
+# Tokens of a C constant expression, see tokenize. Identifiers come first as they are the most common.
+# The second group is the token.
+g_TokenRegex = re.compile(r"""
+    (\s*)                                           # Whitespace before the token
+    ([A-Za-z_]\w*                                   # Identifier
+    |[()]|&&?|==?                                   # The most common punctuation
+    |\.?\d(?:[eE][+-]|[\w.])*                       # Number
+    |"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'            # String or character literal
+    |<<|>>|<=|>=|!=|\|\|                            # Operators
+    |\S)                                            # Punctuation
+""", re.VERBOSE)
+
+# Kind of token by its first character, anything else is punctuation.
+g_TokenKinds = {'"': "string", "'": "string", ".": "number"}
+g_TokenKinds.update((c, "identifier") for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_")
+g_TokenKinds.update((c, "number") for c in "0123456789")
+
 class Settings:
     warn_utf8bom = False
     warn_includeguardname = False
     warn_spacing = False
     print_unuseddefines = False
     print_skippedtypedefs = False
+    print_diagnostics = True
     fake_gameserver_interfaces = False
+    defines = None  # Names, or a dict of name -> value, to only parse the active #if branches for. None parses them all
 
 class BlankLine(object):
-    pass # linenum?
+    __slots__ = ()  # linenum?
 
 class Comment:
+    __slots__ = ("rawprecomments", "precomments", "rawlinecomment", "linecomment")
+
     def __init__(self, rawcomments, comments, rawlinecomment, linecomment):
         self.rawprecomments = rawcomments
         self.precomments = comments
         self.rawlinecomment = rawlinecomment
         self.linecomment = linecomment
 
+class LazyComment(Comment):
+    """A Comment that only keeps which lines of a SourceText it was made from
+
+    The comments are read back out of the source the first time any of the attributes are used."""
+    __slots__ = ("source", "start", "end")
+
+    def __init__(self, source, start, end):
+        self.source = source  # SourceText, None once materialized
+        self.start = start  # First line the comments were collected from
+        self.end = end  # Line the Comment was made on
+
+    def materialize(self):
+        if self.source is None:
+            return
+
+        rawcomments, comments, rawlinecomment, linecomment = self.source.get_comments(self.start, self.end)
+        self.source = None
+        Comment.rawprecomments.__set__(self, rawcomments)
+        Comment.precomments.__set__(self, comments)
+        Comment.rawlinecomment.__set__(self, rawlinecomment)
+        Comment.linecomment.__set__(self, linecomment)
+
+    def __reduce__(self):
+        # Pickled as the lines it was made from, so it stays lazy in ParseCache entries and worker results.
+        if self.source is not None:
+            return (LazyComment, (self.source, self.start, self.end))
+        return (Comment, tuple(getattr(Comment, name).__get__(self, Comment) for name in Comment.__slots__))
+
+def _lazy_comment_attribute(name):
+    slot = getattr(Comment, name)
+
+    def get(self):
+        self.materialize()
+        return slot.__get__(self, Comment)
+
+    def set(self, value):
+        self.materialize()
+        slot.__set__(self, value)
+
+    return property(get, set)
+
+for _name in Comment.__slots__:
+    setattr(LazyComment, _name, _lazy_comment_attribute(_name))
+del _name
+
+class SourceText:
+    """The text of a parsed header, kept so that LazyComments can be read out of it"""
+    __slots__ = ("text", "offsets", "headerline", "openlines")
+
+    def __init__(self, text):
+        if "\r" in text and text.count("\r") != text.count("\r\n"):
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        self.text = text
+        self.offsets = None  # Index each line starts at, built on first use
+        self.headerline = -1  # Line the file header comments were taken on
+        self.openlines = set()  # Lines that start inside of a multiline comment
+
+    def get_line(self, linenum):
+        if self.offsets is None:
+            offsets = array.array("l", [0])
+            find = self.text.find
+            end = find("\n")
+            while end != -1:
+                offsets.append(end + 1)
+                end = find("\n", end + 1)
+            self.offsets = offsets
+
+        start = self.offsets[linenum]
+        if linenum + 1 < len(self.offsets):
+            return self.text[start:self.offsets[linenum + 1] - 1]
+        return self.text[start:]
+
+    def get_comments(self, start, end):
+        """Returns (rawprecomments, precomments, rawlinecomment, linecomment) collected from lines start to end
+
+        Runs the same comment parsing as Parser.parse over just those lines."""
+        parser = Parser.__new__(Parser)
+        s = ParserState(None)
+        s.bInMultilineComment = start in self.openlines
+        for linenum in range(start, end + 1):
+            line = self.get_line(linenum)
+            s.originalline = line
+            s.line = line.rstrip()
+            parser.parse_comments(s)
+            if linenum == self.headerline:
+                s.comments = []
+        return s.rawcomments, s.comments, s.rawlinecomment, s.linecomment
+
 class ArgAttribute:
+    __slots__ = ("name", "value")
+
     def __init__(self, name="", value=""):
         self.name = name
         self.value = value
 
 class Arg:
+    __slots__ = ("name", "type", "default", "attribute")
+
     def __init__(self, name="", type_="", default=None, attribute=None):
         self.name = name
         self.type = type_
@@ -111,11 +249,15 @@ class Arg:
         self.attribute = attribute  # ArgAttribute
 
 class FunctionAttribute:
+    __slots__ = ("name", "value")
+
     def __init__(self):
         self.name = ""
         self.value = ""
 
 class Function:
+    __slots__ = ("name", "returntype", "args", "ifstatements", "comments", "linecomment", "attributes", "private")
+
     def __init__(self):
         self.name = ""
         self.returntype = ""
@@ -133,6 +275,8 @@ class Interface:
         self.c = None  # Comment
 
 class Define:
+    __slots__ = ("name", "value", "spacing", "c")
+
     def __init__(self, name, value, spacing, comments):
         self.name = name
         self.value = value
@@ -140,6 +284,8 @@ class Define:
         self.c = comments
 
 class Constant:
+    __slots__ = ("name", "value", "type", "c")
+
     def __init__(self, name, value, type_, comments):
         self.name = name
         self.value = value
@@ -147,6 +293,8 @@ class Constant:
         self.c = comments  # Comment
 
 class EnumField:
+    __slots__ = ("name", "value", "prespacing", "postspacing", "c")
+
     def __init__(self):
         self.name = ""
         self.value = ""
@@ -162,15 +310,20 @@ class Enum:
         self.endcomments = None  # Comment
 
 class Struct:
-    def __init__(self, name, packsize, comments):
+    def __init__(self, name, packsize, comments, packconditions=None):
         self.name = name
-        self.packsize = packsize
+        self.packsize = packsize  # The #pragma pack stack where the struct was declared, the last value applies
+        # The #if branch each packsize was pushed in, like "defined( VALVE_CALLBACK_PACK_SMALL )", "" if it always is.
+        # Every branch is parsed by default, so the stack can hold pushes which exclude each other, see LayoutEngine.
+        self.packconditions = packconditions if packconditions is not None else [""] * len(packsize)
         self.c = comments  # Comment
         self.fields = []  # StructField
         self.callbackid = None
         self.endcomments = None  # Comment
 
 class StructField:
+    __slots__ = ("name", "type", "arraysize", "c")
+
     def __init__(self, name, typee, arraysize, comments):
         self.name = name
         self.type = typee
@@ -178,6 +331,8 @@ class StructField:
         self.c = comments  # Comment
 
 class Typedef:
+    __slots__ = ("name", "type", "filename", "c")
+
     def __init__(self, name, typee, filename, comments):
         self.name = name
         self.type = typee
@@ -196,10 +351,25 @@ class SteamFile:
         self.callbacks = [] # Struct
         self.interfaces = []  # Interface
         self.typedefs = []  # Typedef
+        self.classes = []  # Names of the classes defined in the file, other than the interfaces
+
+class Token:
+    __slots__ = ("kind", "text", "linenum", "pos")
+
+    def __init__(self, kind, text, linenum, pos):
+        self.kind = kind  # See tokenize
+        self.text = text
+        self.linenum = linenum
+        self.pos = pos  # Column the token starts at
+
+    def __repr__(self):
+        return "Token(%s, %r, %d, %d)" % (self.kind, self.text, self.linenum, self.pos)
 
 class ParserState:
     def __init__(self, file):
         self.f = file  # SteamFile
+        self.source = None  # SourceText, comments are copied out eagerly without one
+        self.commentstart = 0  # First line the current comments were collected from
         self.lines = []
         self.line = ""
         self.originalline = ""
@@ -210,7 +380,14 @@ class ParserState:
         self.rawlinecomment = None
         self.linecomment = None
         self.ifstatements = []
+        self.conditions = None  # ConditionEvaluator, when Settings.defines is set
+        self.branches = []  # [bEnclosingActive, bTaken] for each #if we're inside of, when Settings.defines is set
+        self.bSkipping = False  # In an inactive #if branch
         self.packsize = []
+        self.packconditions = []  # Condition of each packsize entry, see Struct.packconditions
+        # [conditions of the branches so far, condition of the current one, number of the current one] for each #if
+        self.branchconditions = []
+        self.packbranches = []  # The (#if, branch number) of every #if enclosing each packsize entry when it was pushed
         self.funcState = 0
         self.scopeDepth = 0
 
@@ -226,43 +403,1348 @@ class ParserState:
         self.bInPrivate = False
         self.callbackid = None
         self.functionAttributes = [] # FunctionAttribute
+        self.diagnostics = []  # Diagnostic
+
+class Diagnostic:
+    __slots__ = ("severity", "code", "message", "filename", "linenum", "line", "count")
+
+    def __init__(self, severity, code, message, filename, linenum, line):
+        self.severity = severity  # "WARNING", "UNHANDLED" or "INFO"
+        self.code = code
+        self.message = message
+        self.filename = filename
+        self.linenum = linenum
+        self.line = line
+        self.count = 1  # Number of times it was raised when deduplicated
+
+    def copy(self):
+        d = Diagnostic(self.severity, self.code, self.message, self.filename, self.linenum, self.line)
+        d.count = self.count
+        return d
+
+    def __str__(self):
+        if self.severity == "INFO":
+            return self.message + ": " + self.line
+        return "[" + self.severity + "] " + self.message + " - In File: " + self.filename + " - On Line " + str(self.linenum) + " - " + self.line
+
+class Diagnostics:
+    """Collects the warnings and notes raised while parsing, see Parser.diagnostics
+
+    Diagnostics with the same code, message and line text are only kept once, with Diagnostic.count incremented.
+    At most limit diagnostics are kept per code, the rest are only counted.
+    Every kept diagnostic is passed to each of the consumers, printing is one of them unless printing is False."""
+
+    def __init__(self, printing=None, limit=100, dedupe=True):
+        self.records = []  # Diagnostic
+        self.counts = {}  # Code -> number raised, including duplicates and dropped ones
+        self.filecounts = {}  # (Filename, code) -> number raised
+        self.kept = {}  # Code -> number of records kept
+        self.seen = {}  # (code, message, line) -> Diagnostic
+        self.limit = limit
+        self.dedupe = dedupe
+        self.consumers = []
+
+        if printing is None:
+            printing = Settings.print_diagnostics
+        if printing:
+            self.consumers.append(print)
+
+    def add(self, d):
+        self.counts[d.code] = self.counts.get(d.code, 0) + 1
+        key = (d.filename, d.code)
+        self.filecounts[key] = self.filecounts.get(key, 0) + 1
+
+        if self.dedupe:
+            key = (d.code, d.message, d.line)
+            first = self.seen.get(key)
+            if first is not None:
+                first.count += 1
+                return
+            # Copied as its count goes up, and the same records are added to each Parser of parse_many.
+            d = d.copy()
+            self.seen[key] = d
+
+        kept = self.kept.get(d.code, 0)
+        if self.limit is not None and kept >= self.limit:
+            return
+        self.kept[d.code] = kept + 1
+
+        self.records.append(d)
+        for consumer in self.consumers:
+            consumer(d)
+
+    def extend(self, diagnostics):
+        for d in diagnostics:
+            self.add(d)
+
+    def discard(self, filenames):
+        """Forgets the diagnostics raised in the given files, used when they are re-parsed"""
+        filenames = set(filenames)
+        for key, count in list(self.filecounts.items()):
+            if key[0] in filenames:
+                self.counts[key[1]] -= count
+                del self.filecounts[key]
+
+        self.records = [d for d in self.records if d.filename not in filenames]
+        self.seen = {key: d for key, d in self.seen.items() if d.filename not in filenames}
+        self.kept = {}
+        for d in self.records:
+            self.kept[d.code] = self.kept.get(d.code, 0) + 1
+
+    def query(self, code=None, filename=None, severity=None):
+        return [d for d in self.records if (code is None or d.code == code) and (filename is None or d.filename == filename) and (severity is None or d.severity == severity)]
+
+    def get_dropped(self):
+        """Returns code -> number of diagnostics that were deduplicated or over the limit"""
+        kept = {}
+        for d in self.records:
+            kept[d.code] = kept.get(d.code, 0) + 1
+        return {code: count - kept.get(code, 0) for code, count in self.counts.items() if count > kept.get(code, 0)}
+
+class ParseCache:
+    """On-disk cache of parsed SteamFiles keyed by the file contents, the Settings and PARSER_VERSION"""
+
+    def __init__(self, folder, max_size=None, max_age=None):
+        self.folder = folder
+        self.max_size = max_size  # Bytes
+        self.max_age = max_age  # Seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(folder, exist_ok=True)
+
+    def get_key(self, folder, filename):
+        return get_file_key(folder, filename)
+
+    def get_path(self, key):
+        return os.path.join(self.folder, key + ".pickle")
+
+    def load(self, key):
+        """Returns the cached (SteamFile, [Diagnostic]) for key, or None, deleting entries which can't be loaded"""
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as infile:
+                entry = pickle.load(infile)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # Unpickling a truncated or corrupt entry can raise nearly anything.
+            entry = None
+
+        if not (isinstance(entry, tuple) and len(entry) == 2 and isinstance(entry[0], SteamFile) and isinstance(entry[1], list)):
+            self.misses += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+        try:
+            os.utime(path)  # Keeps recently used entries from being evicted.
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def store(self, key, f, diagnostics):
+        path = self.get_path(key)
+        tmppath = path + "." + str(os.getpid()) + ".tmp"
+        with open(tmppath, 'wb') as out:
+            pickle.dump((f, diagnostics), out, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmppath, path)
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith(".pickle"):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        entries.sort()  # Oldest first
+
+        now = time.time()
+        totalsize = sum(e[1] for e in entries)
+        for mtime, size, path in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            oversize = self.max_size is not None and totalsize > self.max_size
+            if not expired and not oversize:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            totalsize -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+class SymbolIndex:
+    """Name lookups over every entity in a list of SteamFiles, see Parser.index
+
+    When a name is defined more than once the first definition, in file order, wins."""
+
+    def __init__(self, files):
+        self.files = {}  # Name -> SteamFile
+        self.defines = {}  # Name -> Define
+        self.constants = {}  # Name -> Constant
+        self.enums = {}  # Name -> Enum
+        self.enumfields = {}  # Name -> EnumField
+        self.structs = {}  # Name -> Struct
+        self.callbacks = {}  # Name -> Struct
+        self.callbackids = {}  # Callback id, like "k_iSteamUserCallbacks + 3" -> Struct
+        self.interfaces = {}  # Name -> Interface
+        self.functions = {}  # Name -> [Function], function names are not unique across interfaces
+        self.typedefs = {}  # Name -> Typedef
+        self.classes = {}  # Name of a class other than an interface -> SteamFile
+        self.owners = {}  # Entity -> SteamFile
+        self.parents = {}  # EnumField -> Enum, Function -> Interface
+
+        for f in files:
+            self.files.setdefault(f.name, f)
+            self.add(self.defines, f.defines, f)
+            self.add(self.constants, f.constants, f)
+            self.add(self.enums, f.enums, f)
+            self.add(self.structs, f.structs, f)
+            self.add(self.callbacks, f.callbacks, f)
+            self.add(self.interfaces, f.interfaces, f)
+            self.add(self.typedefs, f.typedefs, f)
+            for name in f.classes:
+                self.classes.setdefault(name, f)
+
+            for enum in f.enums:
+                self.add(self.enumfields, enum.fields, f)
+                for field in enum.fields:
+                    self.parents[field] = enum
+
+            for callback in f.callbacks:
+                if callback.callbackid is not None:
+                    self.callbackids.setdefault(callback.callbackid, callback)
+
+            for interface in f.interfaces:
+                for function in interface.functions:
+                    # Shared with the interface a GameServer interface was made from.
+                    if function in self.owners:
+                        continue
+                    self.functions.setdefault(function.name, []).append(function)
+                    self.owners[function] = f
+                    self.parents[function] = interface
+
+    def add(self, table, entities, f):
+        for entity in entities:
+            table.setdefault(entity.name, entity)
+            self.owners[entity] = f
+
+    def get_file(self, name):
+        """Returns the SteamFile which defines the named entity or class, or None"""
+        for table in (self.structs, self.callbacks, self.enums, self.interfaces, self.typedefs, self.constants, self.defines, self.enumfields):
+            entity = table.get(name)
+            if entity is not None:
+                return self.owners[entity]
+
+        functions = self.functions.get(name)
+        if functions:
+            return self.owners[functions[0]]
+
+        return self.classes.get(name)
+
+# Filters each QueryIndex kind can be selected by -> the keys an entity is indexed under for that filter.
+g_QueryFilters = {
+    "functions": {
+        "name": lambda function: (function.name,),
+        "attribute": lambda function: [attribute.name for attribute in function.attributes],
+        "argattribute": lambda function: [arg.attribute.name for arg in function.args if arg.attribute],
+        "private": lambda function: (function.private,),
+        "returntype": lambda function: (function.returntype,),
+        "argtype": lambda function: [arg.type for arg in function.args],
+    },
+    "args": {
+        "name": lambda arg: (arg.name,),
+        "attribute": lambda arg: (arg.attribute.name,) if arg.attribute else (),
+        "type": lambda arg: (arg.type,),
+    },
+    "structs": {
+        "name": lambda struct: (struct.name,),
+        # Array fields are also indexed as "type[]", like "char[]".
+        "fieldtype": lambda struct: [field.type for field in struct.fields] +
+                                    [field.type + "[]" for field in struct.fields if field.arraysize],
+        "callback": lambda struct: (struct.callbackid is not None,),
+    },
+}
+
+class QueryIndex:
+    """Selects functions, args and structs by their names, attributes and types, see Parser.queries
+
+    An index of each filter's keys to the positions of the entities that have them is built the first time the
+    filter is used. Filters given together must all match, and are intersected starting from the smallest.
+    A list, tuple or set of keys matches any of them. Results come back in file order."""
+
+    def __init__(self, files):
+        self.functions = []  # Function, without the copies shared by the GameServer interfaces
+        self.args = []  # Arg
+        self.structs = []  # Struct, structs and callbacks
+        self.parents = {}  # Function -> Interface, Arg -> Function
+        self.indexes = {}  # (kind, filter) -> key -> set of positions in that kind's list
+
+        for f in files:
+            self.structs.extend(f.structs)
+            self.structs.extend(f.callbacks)
+            for interface in f.interfaces:
+                for function in interface.functions:
+                    if function in self.parents:
+                        continue
+                    self.parents[function] = interface
+                    self.functions.append(function)
+                    for arg in function.args:
+                        self.parents[arg] = function
+                        self.args.append(arg)
+
+    def get_index(self, kind, name):
+        index = self.indexes.get((kind, name))
+        if index is None:
+            getkeys = g_QueryFilters[kind].get(name)
+            if getkeys is None:
+                raise TypeError("Unknown %s filter: %s" % (kind, name))
+            index = {}
+            for i, entity in enumerate(getattr(self, kind)):
+                for key in getkeys(entity):
+                    index.setdefault(key, set()).add(i)
+            self.indexes[(kind, name)] = index
+        return index
+
+    def select(self, kind, filters):
+        """Returns the entities of kind, "functions", "args" or "structs", matching every filter"""
+        entities = getattr(self, kind)
+        if not filters:
+            return list(entities)
+
+        matches = []
+        for name, keys in filters.items():
+            index = self.get_index(kind, name)
+            if isinstance(keys, (list, tuple, set, frozenset)):
+                matches.append(set().union(*(index.get(key, ()) for key in keys)))
+            else:
+                matches.append(index.get(keys, set()))
+
+        matches.sort(key=len)
+        positions = matches[0].intersection(*matches[1:])
+        return [entities[i] for i in sorted(positions)]
+
+    def get_functions(self, **filters):
+        """Returns the Functions matching the name, attribute, argattribute, private, returntype and argtype filters"""
+        return self.select("functions", filters)
+
+    def get_args(self, **filters):
+        """Returns the Args matching the name, attribute and type filters, parents has the Function of each"""
+        return self.select("args", filters)
+
+    def get_structs(self, **filters):
+        """Returns the structs and callbacks matching the name, fieldtype and callback filters"""
+        return self.select("structs", filters)
+
+class StageStats:
+    __slots__ = ("calls", "lines", "time", "regex", "lastline")
+
+    def __init__(self):
+        self.calls = 0
+        self.lines = 0  # Distinct lines the stage was called on
+        self.time = 0.0  # Seconds, includes any stages called from this one
+        self.regex = 0
+        self.lastline = None
+
+class ParseStats:
+    """Timings and counters collected while parsing, see parse(instrument=True)"""
+
+    def __init__(self):
+        self.files = {}  # Filename -> {"time", "lines", "cached"}
+        self.stages = {}  # Stage name -> StageStats
+        self.active = []  # Stack of the stages currently running
+
+    def get_stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = StageStats()
+            self.stages[name] = stage
+        return stage
+
+    def merge(self, other):
+        self.files.update(other.files)
+        for name, o in other.stages.items():
+            stage = self.get_stage(name)
+            stage.calls += o.calls
+            stage.lines += o.lines
+            stage.time += o.time
+            stage.regex += o.regex
+
+    def report(self):
+        """Returns the collected stats as plain dicts and lists"""
+        return {
+            "files": [dict(name=name, **v) for name, v in self.files.items()],
+            "stages": [
+                {"name": name, "calls": st.calls, "lines": st.lines, "time": st.time, "regex": st.regex}
+                for name, st in sorted(self.stages.items(), key=lambda item: -item[1].time)
+            ],
+            "time": sum(v["time"] for v in self.files.values()),
+            "lines": sum(v["lines"] for v in self.files.values()),
+        }
+
+    def format(self):
+        report = self.report()
+        lines = ["%d lines in %d files, %.3f s" % (report["lines"], len(report["files"]), report["time"])]
+        lines.append("%-36s %10s %10s %10s %10s" % ("Stage", "Time (s)", "Calls", "Lines", "Regex"))
+        for st in report["stages"]:
+            lines.append("%-36s %10.3f %10d %10d %10d" % (st["name"], st["time"], st["calls"], st["lines"], st["regex"]))
+        lines.append("%-36s %10s %10s" % ("File", "Time (s)", "Lines"))
+        for f in sorted(report["files"], key=lambda f: -f["time"]):
+            lines.append("%-36s %10.3f %10d%s" % (f["name"], f["time"], f["lines"], " (cached)" if f["cached"] else ""))
+        return "\n".join(lines)
+
+class CountingPattern:
+    # Stands in for a compiled pattern while instrumenting, attributes each call to the running stage.
+    def __init__(self, pattern, stats):
+        self.pattern = pattern
+        self.stats = stats
+
+    def count(self):
+        if self.stats.active:
+            self.stats.get_stage(self.stats.active[-1]).regex += 1
+
+    def match(self, string):
+        self.count()
+        return self.pattern.match(string)
+
+    def search(self, string):
+        self.count()
+        return self.pattern.search(string)
+
+def _instrument_stage(method, name, stats):
+    stage = stats.get_stage(name)
+    active = stats.active
+    perf_counter = time.perf_counter
+
+    def wrapper(s):
+        stage.calls += 1
+        if stage.lastline is not s.originalline:
+            stage.lastline = s.originalline
+            stage.lines += 1
+        active.append(name)
+        start = perf_counter()
+        try:
+            return method(s)
+        finally:
+            stage.time += perf_counter() - start
+            active.pop()
+
+    return wrapper
+
+class LayoutError(Exception):
+    pass
+
+class TargetABI:
+    """Sizes and alignments of the fundamental types for a target platform
+
+    defines are the ones the platform is built with, like its VALVE_CALLBACK_PACK_xxx. They pick which of the
+    #pragma pack pushes in exclusive #if branches applies, see LayoutEngine.get_packsize."""
+
+    def __init__(self, name, pointersize, longsize, int64align, doublealign, defines=None):
+        self.name = name
+        self.defines = defines or {}  # Name -> value text
+        self.pointersize = pointersize
+        self.enumsize = 4
+        self.fundamentals = {
+            "bool": (1, 1),
+            "char": (1, 1),
+            "signed char": (1, 1),
+            "unsigned char": (1, 1),
+            "short": (2, 2),
+            "signed short": (2, 2),
+            "unsigned short": (2, 2),
+            "short int": (2, 2),
+            "unsigned short int": (2, 2),
+            "int": (4, 4),
+            "signed int": (4, 4),
+            "unsigned int": (4, 4),
+            "unsigned": (4, 4),
+            "long": (longsize, longsize),
+            "signed long": (longsize, longsize),
+            "unsigned long": (longsize, longsize),
+            "long int": (longsize, longsize),
+            "unsigned long int": (longsize, longsize),
+            "long long": (8, int64align),
+            "signed long long": (8, int64align),
+            "unsigned long long": (8, int64align),
+            "__int8": (1, 1),
+            "unsigned __int8": (1, 1),
+            "__int16": (2, 2),
+            "unsigned __int16": (2, 2),
+            "__int32": (4, 4),
+            "unsigned __int32": (4, 4),
+            "__int64": (8, int64align),
+            "unsigned __int64": (8, int64align),
+            "float": (4, 4),
+            "double": (8, doublealign),
+        }
+
+g_TargetABIs = {
+    "win32": TargetABI("win32", pointersize=4, longsize=4, int64align=8, doublealign=8,
+                       defines={"_WIN32": "1", "VALVE_CALLBACK_PACK_LARGE": ""}),
+    "win64": TargetABI("win64", pointersize=8, longsize=4, int64align=8, doublealign=8,
+                       defines={"_WIN32": "1", "_WIN64": "1", "VALVE_CALLBACK_PACK_LARGE": ""}),
+    "linux32": TargetABI("linux32", pointersize=4, longsize=4, int64align=4, doublealign=4,
+                         defines={"POSIX": "1", "__linux__": "1", "VALVE_CALLBACK_PACK_SMALL": ""}),
+    "linux64": TargetABI("linux64", pointersize=8, longsize=8, int64align=8, doublealign=8,
+                         defines={"POSIX": "1", "__linux__": "1", "VALVE_CALLBACK_PACK_SMALL": ""}),
+    "macos64": TargetABI("macos64", pointersize=8, longsize=8, int64align=8, doublealign=8,
+                         defines={"POSIX": "1", "__APPLE__": "1", "VALVE_CALLBACK_PACK_SMALL": ""}),
+}
+
+# Classes the parser doesn't model as structs, with their (size, alignment).
+# Both are declared inside #pragma pack( push, 1 ).
+g_OpaqueTypes = {
+    "CSteamID": (8, 1),
+    "CGameID": (8, 1),
+}
+
+class FieldLayout:
+    __slots__ = ("field", "offset", "size", "alignment", "count")
+
+    def __init__(self, field, offset, size, alignment, count):
+        self.field = field  # StructField
+        self.offset = offset
+        self.size = size  # Of the whole field, count elements
+        self.alignment = alignment  # After #pragma pack was applied
+        self.count = count  # Array size, 1 for plain fields
+
+class StructLayout:
+    __slots__ = ("struct", "size", "alignment", "packsize", "fields")
+
+    def __init__(self, struct, size, alignment, packsize, fields):
+        self.struct = struct
+        self.size = size
+        self.alignment = alignment
+        self.packsize = packsize  # None when the struct isn't packed
+        self.fields = fields  # FieldLayout
+
+class LayoutEngine:
+    """Computes the memory layout of structs and callbacks for a TargetABI, see Parser.get_layout_engine
+
+    Field types are resolved through the typedefs, enums and other structs of the model. Results are memoized."""
+
+    def __init__(self, parser, abi):
+        if not isinstance(abi, TargetABI):
+            abi = g_TargetABIs[abi]
+        self.abi = abi
+        self.index = parser.index
+        self.resolver = parser.type_resolver
+        self.evaluator = parser.evaluator
+        self.conditions = ConditionEvaluator(abi.defines)
+        self.types = {}  # Type string -> (size, alignment)
+        self.layouts = {}  # Struct name -> StructLayout
+        self.pending = set()  # Struct names being laid out, to catch recursive structs
+
+    def get_type_layout(self, typename):
+        """Returns (size, alignment) of a type, without any #pragma pack applied"""
+        result = self.types.get(typename)
+        if result is None:
+            result = self.resolve_type(typename)
+            self.types[typename] = result
+        return result
+
+    def resolve_type(self, typename):
+        qualifiers, name, pointers = split_type(self.resolver.resolve(typename))
+        if "*" in pointers or "&" in pointers:
+            return (self.abi.pointersize, self.abi.pointersize)
+
+        name = " ".join(w for w in name.split() if w not in ("struct", "enum"))
+
+        result = self.abi.fundamentals.get(name)
+        if result is not None:
+            return result
+
+        if name in self.index.enums:
+            return (self.abi.enumsize, self.abi.enumsize)
+
+        struct = self.index.structs.get(name) or self.index.callbacks.get(name)
+        if struct is not None:
+            layout = self.get_layout(struct)
+            return (layout.size, layout.alignment)
+
+        result = g_OpaqueTypes.get(name)
+        if result is not None:
+            return result
+
+        raise LayoutError("Unknown type: " + typename)
+
+    def get_array_count(self, arraysize):
+        if arraysize is None:
+            return 1
+
+        try:
+            count = self.evaluator.evaluate(arraysize)
+        except EvaluationError:
+            raise LayoutError("Can't resolve array size: " + arraysize)
+        if not isinstance(count, int):
+            raise LayoutError("Array size isn't an integer: " + arraysize)
+        return count
+
+    def get_layout(self, struct):
+        """Returns the StructLayout of a Struct, or of the struct or callback with that name"""
+        if not isinstance(struct, Struct):
+            name = struct
+            struct = self.index.structs.get(name) or self.index.callbacks.get(name)
+            if struct is None:
+                raise LayoutError("Unknown struct: " + name)
+
+        layout = self.layouts.get(struct.name)
+        if layout is not None and layout.struct is struct:
+            return layout
+
+        if struct.name in self.pending:
+            raise LayoutError("Struct contains itself: " + struct.name)
+        self.pending.add(struct.name)
+        try:
+            layout = self.compute_layout(struct)
+        finally:
+            self.pending.discard(struct.name)
+
+        self.layouts.setdefault(struct.name, layout)
+        return layout
+
+    def get_packsize(self, struct):
+        """Returns the #pragma pack value which applies to a struct on this ABI, or None
+
+        Pushes made in #if branches which aren't active with the ABI's defines are skipped. A condition which
+        can't be evaluated counts as active, like it does when parsing with Settings.defines."""
+        packsize = None
+        for size, condition in zip(struct.packsize, struct.packconditions):
+            if condition:
+                try:
+                    if not self.conditions.evaluate(condition):
+                        continue
+                except EvaluationError:
+                    pass
+            packsize = size
+        return packsize
+
+    def compute_layout(self, struct):
+        packsize = self.get_packsize(struct)
+
+        offset = 0
+        alignment = 1
+        fields = []
+        for field in struct.fields:
+            try:
+                size, align = self.get_type_layout(field.type)
+                count = self.get_array_count(field.arraysize)
+            except LayoutError as e:
+                raise LayoutError(struct.name + "." + field.name + ": " + str(e))
+
+            if packsize is not None:
+                align = min(align, packsize)
+
+            offset = (offset + align - 1) // align * align
+            fields.append(FieldLayout(field, offset, size * count, align, count))
+            offset += size * count
+            alignment = max(alignment, align)
+
+        # Empty structs still take up a byte in C++.
+        size = max(1, (offset + alignment - 1) // alignment * alignment)
+        return StructLayout(struct, size, alignment, packsize, fields)
+
+    def get_all(self):
+        """Lays out every struct and callback, returns ({name: StructLayout}, {name: error message})"""
+        layouts = {}
+        errors = {}
+        for struct in list(self.index.structs.values()) + list(self.index.callbacks.values()):
+            try:
+                layouts[struct.name] = self.get_layout(struct)
+            except LayoutError as e:
+                errors[struct.name] = str(e)
+        return layouts, errors
+
+g_TypeQualifiers = ("const", "volatile")
+
+# Every spelling of the built in types that shows up in the headers.
+g_FundamentalTypes = frozenset(g_TargetABIs["win64"].fundamentals) | frozenset(("void",))
+
+def split_type(typename):
+    """Splits a type string like "const uint8 *" into (qualifiers, base name, pointer suffix)"""
+    words = typename.replace("*", " * ").replace("&", " & ").split()
+    qualifiers = []
+    base = []
+    pointers = []
+    for w in words:
+        if w == "*" or w == "&":
+            pointers.append(w)
+        elif w in g_TypeQualifiers and not base:
+            qualifiers.append(w)
+        elif w in g_TypeQualifiers:
+            pointers.append(w)
+        else:
+            base.append(w)
+    return " ".join(qualifiers), " ".join(base), " ".join(pointers)
+
+class TypeResolver:
+    """Resolves typedef chains down to the fundamental or named type they stand for, see Parser.type_resolver
+
+    Every typedef is resolved once up front. Pointer suffixes recorded by parse_typedefs, like "char *", are kept.
+    When a typedef is defined more than once the first definition, in file order, is used."""
+
+    def __init__(self, parser):
+        index = parser.index
+        self.typedefs = {name: t.type for name, t in index.typedefs.items()}
+        self.known = set(index.enums) | set(index.structs) | set(index.callbacks) | set(index.interfaces) | set(g_OpaqueTypes)
+        self.canonical = {}  # Typedef name -> canonical type string
+        self.chains = {}  # Typedef name -> [each type in the chain, ending with the canonical one]
+        self.cycles = []  # [typedef names], one per cycle found
+        self.unknown = {}  # Typedef name -> base type which isn't fundamental, a typedef or anything else in the model
+        self.resolved = {}  # Any type string -> canonical type string
+
+        for name in self.typedefs:
+            self.resolve_typedef(name, [])
+
+    def resolve_typedef(self, name, stack):
+        canonical = self.canonical.get(name)
+        if canonical is not None:
+            return canonical
+
+        if name in stack:
+            cycle = stack[stack.index(name):]
+            self.cycles.append(cycle)
+            for n in cycle:
+                self.canonical[n] = n
+                self.chains[n] = [n]
+            return name
+
+        stack.append(name)
+        typename = self.typedefs[name]
+        qualifiers, base, pointers = split_type(typename)
+        if base in self.typedefs:
+            inner = self.resolve_typedef(base, stack)
+            chain = [typename] + self.chains[base][1:]
+        else:
+            inner = base
+            chain = [typename]
+            if base not in g_FundamentalTypes and base not in self.known:
+                self.unknown[name] = base
+        stack.pop()
+
+        if name in self.canonical:
+            # Part of a cycle found further down.
+            return self.canonical[name]
+
+        canonical = join_type(qualifiers, inner, pointers)
+        if chain[-1] != canonical:
+            chain.append(canonical)
+        self.canonical[name] = canonical
+        self.chains[name] = [name] + chain
+        return canonical
+
+    def resolve(self, typename):
+        """Returns the canonical form of any type string, like "const HSteamPipe *" -> "const int *" """
+        canonical = self.resolved.get(typename)
+        if canonical is None:
+            qualifiers, base, pointers = split_type(typename)
+            canonical = join_type(qualifiers, self.canonical.get(base, base), pointers)
+            self.resolved[typename] = canonical
+        return canonical
+
+    def resolve_all(self, parser):
+        """Returns {Arg or StructField: canonical type} for every arg and field in the model"""
+        result = {}
+        for f in parser.files:
+            for struct in f.structs + f.callbacks:
+                for field in struct.fields:
+                    result[field] = self.resolve(field.type)
+            for interface in f.interfaces:
+                for function in interface.functions:
+                    for arg in function.args:
+                        result[arg] = self.resolve(arg.type)
+        return result
+
+class EvaluationError(Exception):
+    pass
+
+def _divide(a, b):
+    # C division truncates towards zero.
+    if isinstance(a, int) and isinstance(b, int):
+        q = abs(a) // abs(b)
+        return q if (a < 0) == (b < 0) else -q
+    return a / b
+
+def _modulo(a, b):
+    return a - _divide(a, b) * b
+
+# Binary operators by precedence, higher binds tighter.
+g_BinaryOperators = {
+    "||": (1, lambda a, b: int(bool(a) or bool(b))),
+    "&&": (2, lambda a, b: int(bool(a) and bool(b))),
+    "|": (3, operator.or_),
+    "^": (4, operator.xor),
+    "&": (5, operator.and_),
+    "==": (6, lambda a, b: int(a == b)),
+    "!=": (6, lambda a, b: int(a != b)),
+    "<": (7, lambda a, b: int(a < b)),
+    "<=": (7, lambda a, b: int(a <= b)),
+    ">": (7, lambda a, b: int(a > b)),
+    ">=": (7, lambda a, b: int(a >= b)),
+    "<<": (8, operator.lshift),
+    ">>": (8, operator.rshift),
+    "+": (9, operator.add),
+    "-": (9, operator.sub),
+    "*": (10, operator.mul),
+    "/": (10, _divide),
+    "%": (10, _modulo),
+}
+
+g_UnaryOperators = {
+    "-": operator.neg,
+    "+": operator.pos,
+    "~": operator.invert,
+    "!": lambda a: int(not a),
+}
+
+# Words that can make up a cast along with the typedefs, like ( unsigned int ).
+g_CastWords = frozenset(("unsigned", "signed", "const", "int", "long", "short", "char", "bool", "float", "double"))
+
+def parse_number(text):
+    """Returns the value of a C integer or floating point literal like 0x1Fu, 010 or 0.5f"""
+    lowered = text.lower()
+    if lowered.startswith("0x"):
+        return int(lowered.rstrip("ul"), 16)
+    if "." in lowered or ("e" in lowered and not lowered.startswith("0x")):
+        return float(lowered.rstrip("fl"))
+    lowered = lowered.rstrip("ul")
+    if len(lowered) > 1 and lowered[0] == "0":
+        return int(lowered, 8)
+    return int(lowered)
+
+class ExpressionEvaluator:
+    """Evaluates C constant expressions, subclasses say what an identifier is worth by implementing get_value()
+
+    Needs self.casttypes, the words a cast can be made of, and self.results, a memo of expression text to its
+    value or the EvaluationError it raised."""
+
+    def get_value(self, name):
+        raise NotImplementedError
+
+    def evaluate(self, expression):
+        """Returns the value of a constant expression like "k_iSteamUserCallbacks + 17" or "( 1 << 3 )" """
+        result = self.results.get(expression)
+        if result is None:
+            try:
+                tokens = tokenize(expression)
+                if not tokens:
+                    raise EvaluationError("Empty expression")
+                result, i = self.parse_binary(tokens, 0, 1)
+                if i != len(tokens):
+                    raise EvaluationError("Unexpected '%s' in: %s" % (tokens[i].text, expression))
+            except EvaluationError as e:
+                result = e
+            except (ArithmeticError, TypeError, ValueError) as e:
+                result = EvaluationError("%s in: %s" % (e, expression))
+            self.results[expression] = result
+
+        if isinstance(result, EvaluationError):
+            raise result
+        return result
+
+    def parse_binary(self, tokens, i, minprecedence):
+        value, i = self.parse_unary(tokens, i)
+        while i < len(tokens):
+            op = g_BinaryOperators.get(tokens[i].text)
+            if op is None or op[0] < minprecedence:
+                break
+            rhs, i = self.parse_binary(tokens, i + 1, op[0] + 1)
+            value = op[1](value, rhs)
+        return value, i
+
+    def parse_unary(self, tokens, i):
+        if i == len(tokens):
+            raise EvaluationError("Unexpected end of expression")
+
+        token = tokens[i]
+        op = g_UnaryOperators.get(token.text)
+        if op is not None:
+            value, i = self.parse_unary(tokens, i + 1)
+            return op(value), i
+
+        if token.text == "(":
+            end = self.get_cast_end(tokens, i + 1)
+            if end is not None:
+                return self.parse_unary(tokens, end + 1)
+
+            value, i = self.parse_binary(tokens, i + 1, 1)
+            if i == len(tokens) or tokens[i].text != ")":
+                raise EvaluationError("Missing ')'")
+            return value, i + 1
+
+        if token.kind == "number":
+            return parse_number(token.text), i + 1
+
+        if token.kind == "identifier":
+            return self.get_value(token.text), i + 1
+
+        raise EvaluationError("Can't evaluate '%s'" % token.text)
+
+    def get_cast_end(self, tokens, i):
+        # Returns the index of the ')' closing a cast like ( uint32 ) starting at i, or None.
+        start = i
+        while i < len(tokens) and (tokens[i].text in self.casttypes or (tokens[i].text == "*" and i > start)):
+            i += 1
+        if i > start and i < len(tokens) - 1 and tokens[i].text == ")":
+            return i
+        return None
+
+class ValueEvaluator(ExpressionEvaluator):
+    """Evaluates the values of every define, constant and enum field, and the callback ids, see Parser.evaluator
+
+    Identifiers are looked up across all files, constants first, then defines, then enum fields. Enum fields
+    without a value follow on from the previous field. Every name and expression is evaluated once, in the
+    constructor. Values are Python ints, or floats, and aren't wrapped to the size of their type."""
+
+    def __init__(self, parser):
+        index = parser.index
+        self.expressions = {}  # Name -> expression text
+        for enum in index.enums.values():
+            previous = None
+            for field in enum.fields:
+                name = field.name.rstrip(",")
+                value = field.value.strip().rstrip(",").strip()
+                if not value:
+                    value = "0" if previous is None else "(" + previous + ") + 1"
+                self.expressions.setdefault(name, value)
+                previous = name
+        for name, define in index.defines.items():
+            self.expressions[name] = define.value.strip()
+        for name, constant in index.constants.items():
+            self.expressions[name] = constant.value.strip().rstrip(",").strip()
+
+        self.casttypes = g_CastWords | frozenset(index.typedefs)
+        self.values = {}  # Name -> value
+        self.errors = {}  # Name -> why it has no value, for defines of strings too
+        self.results = {}  # Expression text -> value, or the EvaluationError it raised
+        self.resolving = set()  # Names being evaluated, to find cycles
+
+        for name in self.expressions:
+            try:
+                self.get_value(name)
+            except EvaluationError:
+                pass
+
+        self.callbacks = {}  # Callback id -> Struct
+        self.callbackids = {}  # Callback struct name -> callback id
+        for struct in list(index.callbacks.values()) + list(index.structs.values()):
+            if struct.callbackid is None:
+                continue
+            try:
+                callbackid = self.evaluate(struct.callbackid)
+            except EvaluationError as e:
+                self.errors[struct.name] = str(e)
+                continue
+            self.callbackids[struct.name] = callbackid
+            other = self.callbacks.setdefault(callbackid, struct)
+            if other is not struct:
+                self.errors[struct.name] = "Callback id %d is also used by %s" % (callbackid, other.name)
+
+    def get_value(self, name):
+        """Returns the value of a define, constant or enum field, raises EvaluationError if it has none"""
+        value = self.values.get(name)
+        if value is not None:
+            return value
+        if name in self.errors:
+            raise EvaluationError(self.errors[name])
+        if name in self.resolving:
+            raise EvaluationError("Cycle through " + name)
+
+        expression = self.expressions.get(name)
+        if expression is None:
+            raise EvaluationError("Unknown identifier: " + name)
+
+        self.resolving.add(name)
+        try:
+            value = self.evaluate(expression)
+        except EvaluationError as e:
+            self.errors[name] = str(e)
+            raise
+        finally:
+            self.resolving.discard(name)
+
+        self.values[name] = value
+        return value
+
+def normalize_defines(defines):
+    """Returns Settings.defines as a dict of name -> value text, a set of names are each defined as 1"""
+    if isinstance(defines, dict):
+        return {name: str(value) for name, value in defines.items()}
+    return dict.fromkeys(defines, "1")
+
+class ConditionEvaluator(ExpressionEvaluator):
+    """Evaluates #if and #elif conditions against a set of defines, see Settings.defines
+
+    As in the preprocessor, identifiers which aren't defined are 0, and so are defines without a value.
+    One is made per file, so that the #defines and #undefs in that file only change its own conditions."""
+
+    def __init__(self, defines):
+        self.defines = normalize_defines(defines)  # Name -> value text
+        self.casttypes = frozenset()
+        self.results = {}
+        self.resolving = set()
+
+    def define(self, name, value):
+        self.defines[name] = value
+        self.results = {}
+
+    def undefine(self, name):
+        if self.defines.pop(name, None) is not None:
+            self.results = {}
+
+    def get_value(self, name):
+        value = self.defines.get(name)
+        if not value:
+            return 0
+        if name in self.resolving:
+            raise EvaluationError("Cycle through " + name)
+
+        self.resolving.add(name)
+        try:
+            return self.evaluate(value)
+        finally:
+            self.resolving.discard(name)
+
+    def parse_unary(self, tokens, i):
+        if i == len(tokens) or tokens[i].text != "defined":
+            return ExpressionEvaluator.parse_unary(self, tokens, i)
+
+        i += 1
+        bParenthesized = i < len(tokens) and tokens[i].text == "("
+        if bParenthesized:
+            i += 1
+        if i == len(tokens) or tokens[i].kind != "identifier":
+            raise EvaluationError("Expected a name after defined")
+        value = int(tokens[i].text in self.defines)
+        i += 1
+        if bParenthesized:
+            if i == len(tokens) or tokens[i].text != ")":
+                raise EvaluationError("Missing ')'")
+            i += 1
+        return value, i
+
+def join_type(qualifiers, base, pointers):
+    return " ".join(part for part in (qualifiers, base, pointers) if part)
+
+def _is_other_branch(a, b):
+    # True if two ParserState.packbranches entries are in different branches of the same #if, so only one of them
+    # is ever compiled.
+    for (ifa, brancha), (ifb, branchb) in zip(a, b):
+        if ifa is not ifb:
+            return False
+        if brancha != branchb:
+            return True
+    return False
 
 class Parser:
     files = None
     typedefs = []
+    stats = None  # ParseStats
+    _index = None
+    _layoutengines = None
+    _typeresolver = None
+    _evaluator = None
+    _queries = None
 
-    def __init__(self, folder):
-        self.files = [SteamFile(f) for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f)) and f.endswith(".h") and f not in g_SkippedFiles]
-        self.files
-        self.files.sort(key=lambda f: f.name)
+    def __init__(self, folder, workers=None, cache=None, instrument=False, diagnostics=None, shared=None, strings=None):
+        self.folder = folder
+        self.workers = workers
+        self.shared = shared  # File key -> (SteamFile, [Diagnostic]), see parse_many
 
-        self.typedefs = []
+        if strings is None:
+            strings = {}
+        self.strings = strings  # String table, see intern_strings
 
-        for f in self.files:
-            s = ParserState(f)
-            filepath = os.path.join(folder, f.name)
-            with open(filepath, 'r', encoding="latin-1") as infile:
-                s.lines = infile.readlines()
+        if diagnostics is None:
+            diagnostics = Diagnostics()
+        self.diagnostics = diagnostics
 
-                if s.lines[0][:3] == codecs.BOM_UTF8:
-                    s.lines[0] = s.lines[0][3:]
-                    if Settings.warn_utf8bom:
-                        printWarning("File contains a UTF8 BOM.", s)
+        if instrument:
+            self.enable_instrumentation()
 
-                self.parse(s)
+        if cache is not None and not isinstance(cache, ParseCache):
+            cache = ParseCache(cache)
+        self.cache = cache
+
+        self.filestats = self.get_filestats()
+        self.files = self.load_files(sorted(self.filestats))
+
+        # Rebuilt from the files so that cached and parallel results keep the serial ordering.
+        self.typedefs = [t for f in self.files for t in f.typedefs]
 
         # Hack to give us the GameServer interfaces.
         # We want this for autogen but probably don't want it for anything else.
+        # Keyed by the name of the file they were made from.
+        self.gameserver_files = {}
         if Settings.fake_gameserver_interfaces:
             for f in [f for f in self.files if f.name in g_GameServerInterfaces]:
-                gs_f = SteamFile(f.name.replace("isteam", "isteamgameserver", 1))
-                gs_f.interfaces = copy.deepcopy(f.interfaces)
-                for i in gs_f.interfaces:
-                    i.name = i.name.replace("ISteam", "ISteamGameServer", 1)
+                gs_f = self.make_gameserver_file(f)
+                self.gameserver_files[f.name] = gs_f
                 self.files.append(gs_f)
 
+    def get_filestats(self):
+        filestats = {}
+        for f in os.listdir(self.folder):
+            if not f.endswith(".h") or f in g_SkippedFiles:
+                continue
+            filepath = os.path.join(self.folder, f)
+            if not os.path.isfile(filepath):
+                continue
+            st = os.stat(filepath)
+            filestats[f] = (st.st_mtime_ns, st.st_size)
+        return filestats
+
+    def load_files(self, filenames, discard=()):
+        # discard names files whose earlier diagnostics are dropped, once the files have loaded.
+        files = [SteamFile(f) for f in filenames]
+        diagnostics = {}  # Filename -> [Diagnostic]
+        cache = self.cache
+
+        shared = self.shared
+
+        pending = files
+        keys = {}
+        if cache or shared is not None:
+            pending = []
+            for i, f in enumerate(files):
+                key = get_file_key(self.folder, f.name)
+                cached = None
+                if shared is not None:
+                    cached = shared.get(key)
+                if cached is None and cache:
+                    cached = cache.load(key)
+                    if cached is not None:
+                        intern_strings(cached[0], self.strings)
+                        if shared is not None:
+                            shared[key] = cached
+
+                if cached is None:
+                    keys[f.name] = key
+                    pending.append(f)
+                else:
+                    files[i], diagnostics[f.name] = cached
+                    if self.stats is not None:
+                        self.stats.files[f.name] = {"time": 0.0, "lines": 0, "cached": True}
+
+        parsed = self.parse_files(self.folder, pending, self.workers)
+
+        for f, records in parsed:
+            intern_strings(f, self.strings)
+            if cache:
+                cache.store(keys[f.name], f, records)
+            if shared is not None:
+                shared[keys[f.name]] = (f, records)
+        if cache:
+            cache.evict()
+
+        for f, records in parsed:
+            diagnostics[f.name] = records
+
+        if discard:
+            self.diagnostics.discard(discard)
+
+        # Added in file order, so diagnostics come out the same however the files were loaded.
+        for f in files:
+            self.diagnostics.extend(diagnostics[f.name])
+
+        parsed = {f.name: f for f, records in parsed}
+        return [parsed.get(f.name, f) for f in files]
+
+    def make_gameserver_file(self, f):
+        gs_f = SteamFile(f.name.replace("isteam", "isteamgameserver", 1))
+        # The GameServer interfaces only differ by name, they share the functions and comments of the originals.
+        for i in f.interfaces:
+            gs_i = Interface()
+            gs_i.name = i.name.replace("ISteam", "ISteamGameServer", 1)
+            gs_i.functions = i.functions
+            gs_i.c = i.c
+            gs_f.interfaces.append(gs_i)
+        return gs_f
+
+    def reparse(self, paths):
+        """Re-parses only the given files and splices them into the model
+
+        Paths that no longer exist are removed from the model. Returns the new SteamFiles, including any
+        GameServer copies made from them. If a file fails to parse the model is left as it was, and the
+        files are still reported by get_changed_files."""
+        names = set(os.path.basename(path) for path in paths)
+        names = set(n for n in names if n.endswith(".h") and n not in g_SkippedFiles)
+
+        filestats = self.get_filestats()
+        changed = self.load_files(sorted(n for n in names if n in filestats), names)
+        for name in names:
+            if name in filestats:
+                self.filestats[name] = filestats[name]
+            else:
+                self.filestats.pop(name, None)
+
+        gs_files = set(id(f) for f in self.gameserver_files.values())
+        files = {f.name: f for f in self.files if id(f) not in gs_files and f.name in self.filestats}
+        files.update((f.name, f) for f in changed)
+        self.files = [files[name] for name in sorted(files)]
+
+        self.typedefs = [t for f in self.files for t in f.typedefs]
+        self.invalidate_index()
+
+        if Settings.fake_gameserver_interfaces:
+            for f in list(changed):
+                if f.name in g_GameServerInterfaces:
+                    gs_f = self.make_gameserver_file(f)
+                    self.gameserver_files[f.name] = gs_f
+                    changed.append(gs_f)
+            for name in list(self.gameserver_files):
+                if name not in files:
+                    del self.gameserver_files[name]
+            for f in [f for f in self.files if f.name in g_GameServerInterfaces]:
+                self.files.append(self.gameserver_files[f.name])
+
+        return changed
+
+    @property
+    def index(self):
+        """SymbolIndex over Parser.files, built on first use"""
+        if self._index is None:
+            self._index = SymbolIndex(self.files)
+        return self._index
+
+    def invalidate_index(self):
+        """Drops the SymbolIndex and everything built on it, call this after modifying Parser.files by hand"""
+        self._index = None
+        self._layoutengines = None
+        self._typeresolver = None
+        self._evaluator = None
+        self._queries = None
+
+    @property
+    def queries(self):
+        """QueryIndex over Parser.files, built on first use"""
+        if self._queries is None:
+            self._queries = QueryIndex(self.files)
+        return self._queries
+
+    @property
+    def evaluator(self):
+        """ValueEvaluator over every define, constant, enum field and callback id, built on first use"""
+        if self._evaluator is None:
+            self._evaluator = ValueEvaluator(self)
+        return self._evaluator
+
+    @property
+    def type_resolver(self):
+        """TypeResolver over Parser.typedefs, built on first use"""
+        if self._typeresolver is None:
+            self._typeresolver = TypeResolver(self)
+        return self._typeresolver
+
+    def get_layout_engine(self, abi="win64"):
+        """Returns the LayoutEngine for a TargetABI or one of the g_TargetABIs names, reused until the model changes"""
+        if self._layoutengines is None:
+            self._layoutengines = {}
+        key = abi.name if isinstance(abi, TargetABI) else abi
+        engine = self._layoutengines.get(key)
+        if engine is None:
+            engine = LayoutEngine(self, abi)
+            self._layoutengines[key] = engine
+        return engine
+
+    def get_changed_files(self):
+        """Returns the names of the headers which were added, removed or modified since they were last parsed"""
+        filestats = self.get_filestats()
+        return [name for name in set(filestats) | set(self.filestats) if filestats.get(name) != self.filestats.get(name)]
+
+    def watch(self, interval=1.0):
+        """Polls the folder forever and yields the list of re-parsed SteamFiles whenever headers change"""
+        while True:
+            time.sleep(interval)
+            paths = self.get_changed_files()
+            if paths:
+                yield self.reparse(paths)
+
+    def parse_files(self, folder, files, workers=None):
+        if workers is not None and workers > 1 and len(files) > 1:
+            # Each file gets its own ParserState, so the files can be parsed independently.
+            # The results come back in submission order which keeps the output identical to the serial path.
+            instrument = self.stats is not None
+            jobs = [(folder, f.name, get_settings(), instrument) for f in files]
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_parse_file_worker, jobs))
+
+            if instrument:
+                for f, diagnostics, stats in results:
+                    self.stats.merge(stats)
+            return [(f, diagnostics) for f, diagnostics, stats in results]
+
+        return [(f, self.parse_file(folder, f)) for f in files]
+
+    def parse_file(self, folder, f):
+        """Parses a single file into f and returns the list of Diagnostics raised while doing so"""
+        text, bHasBOM = read_header(os.path.join(folder, f.name))
+        return self.parse_text(f, text, bHasBOM)
+
+    def parse_text(self, f, text, bHasBOM=False):
+        """Parses the already read contents of a header into f, see parse_file"""
+        s = ParserState(f)
+        if Settings.defines is not None:
+            s.conditions = ConditionEvaluator(Settings.defines)
+        s.source = SourceText(text)
+        s.lines = iter_lines(s.source.text)
+
+        if bHasBOM and Settings.warn_utf8bom:
+            addWarning("utf8bom", "File contains a UTF8 BOM.", s)
+
+        if self.stats is None:
+            self.parse(s)
+        else:
+            self.parse_instrumented(s)
+
+        return s.diagnostics
+
+    def enable_instrumentation(self):
+        """Collects timings and counters into Parser.stats for everything parsed from now on"""
+        if self.stats is not None:
+            return
+
+        self.stats = ParseStats()
+        # Shadows the methods on this instance only, so there's no cost when instrumentation is off.
+        for name in g_InstrumentedStages:
+            setattr(self, name, _instrument_stage(getattr(self, name), name, self.stats))
+
+    def parse_instrumented(self, s):
+        # The patterns are module globals, swap in counting ones while this file is parsed.
+        module = globals()
+        patterns = {name: module[name] for name in g_InstrumentedPatterns}
+        for name, pattern in patterns.items():
+            module[name] = CountingPattern(pattern, self.stats)
+
+        start = time.perf_counter()
+        try:
+            self.parse(s)
+        finally:
+            module.update(patterns)
+
+        self.stats.files[s.f.name] = {"time": time.perf_counter() - start, "lines": s.linenum + 1, "cached": False}
+
     def parse(self, s):
         for linenum, line in enumerate(s.lines):
+            if s.bSkipping and not s.bInMultilineComment and "#" not in line and "/*" not in line:
+                # Nothing on this line can end the inactive #if branch, so it's dropped before parsing comments.
+                s.linenum = linenum
+                self.discard_comments(s)
+                continue
+
             s.line = line
             s.originalline = line
             s.linenum = linenum
@@ -280,21 +1762,46 @@ class Parser:
             if s.bInHeader:
                 self.parse_header(s)
 
+            if s.conditions is not None and self.parse_conditions(s):
+                self.consume_comments(s)
+                continue
+
             if self.parse_skippedlines(s):
                 self.consume_comments(s)
                 continue
 
+            self.dispatch(s)
+
+    def dispatch(self, s):
+        # Runs the sub-parsers that can act on this line, in the same order they have always run in.
+        # Each one is picked either by the first token of the line or by what we are currently inside of.
+        # The mode checks are made right before each call because earlier sub-parsers can open or close a mode.
+        token = s.linesplit[0]
+        if token[0] == "#":
             self.parse_preprocessor(s)
-            self.parse_typedefs(s)
-            self.parse_constants(s)
+        else:
+            handler = g_TokenHandlers.get(token)
+            if handler is not None:
+                getattr(self, handler)(s)
+
+        if s.enum or token == "enum":
             self.parse_enums(s)
+
+        if not s.enum and (s.struct or token == "struct"):
             self.parse_structs(s)
+
+        if s.callbackmacro or token.startswith("STEAM_CALLBACK_BEGIN"):
             self.parse_callbackmacros(s)
+
+        if s.interface or (token == "class" and s.line.startswith("class ISteam")):
             self.parse_interfaces(s)
             if not s.line:
-                continue
+                return
 
+        if s.linesplit[0] == "class":
             self.parse_classes(s)
+
+        if "{" in s.line or "}" in s.line:
             self.parse_scope(s)
 
     def parse_comments(self, s):
@@ -303,6 +1810,9 @@ class Parser:
         s.line = s.line.strip()
 
     def parse_comments_multiline(self, s):
+        if not s.bInMultilineComment and "/*" not in s.line and "*/" not in s.line:
+            return
+
         strComment = None
         multilineOpenerPos = s.line.find("/*")
         bHasOpening = (multilineOpenerPos != -1)
@@ -364,8 +1874,64 @@ class Parser:
         if s.line:
             s.f.header.extend(s.comments)
             s.comments = []
+            if s.source is not None:
+                s.source.headerline = s.linenum
             s.bInHeader = False
 
+    def parse_conditions(self, s):
+        # Follows which #if branches are active with Settings.defines, returns True if the line is in an inactive one.
+        # The #if, #elif, #else and #endif of active enclosing branches still go on to parse_preprocessor,
+        # so that the ifstatements stay balanced.
+        match = g_ConditionalRegex.match(s.line) if s.line[0] == "#" else None
+        if match is None:
+            return s.bSkipping
+
+        directive, rest = match.groups()
+        if directive == "define" or directive == "undef":
+            if not s.bSkipping:
+                name, value = g_DefineNameRegex.match(rest).groups()
+                if directive == "undef":
+                    s.conditions.undefine(name)
+                elif name:
+                    s.conditions.define(name, value.strip())
+            return s.bSkipping
+
+        if directive.startswith("if"):
+            bEnclosingActive = not s.bSkipping
+            bTaken = bEnclosingActive and self.evaluate_condition(s, directive, rest)
+            s.branches.append([bEnclosingActive, bTaken])
+            s.bSkipping = not bTaken
+            return not bEnclosingActive
+
+        if not s.branches:
+            addWarning("condition", "#%s without an #if." % directive, s)
+            return s.bSkipping
+
+        branch = s.branches[-1]
+        bEnclosingActive, bTaken = branch
+        if directive == "endif":
+            s.branches.pop()
+            s.bSkipping = not bEnclosingActive
+        elif directive == "else":
+            s.bSkipping = not bEnclosingActive or bTaken
+            branch[1] = True
+        else:
+            bActive = bEnclosingActive and not bTaken and self.evaluate_condition(s, directive, rest)
+            branch[1] = bTaken or bActive
+            s.bSkipping = not bActive
+        return not bEnclosingActive
+
+    def evaluate_condition(self, s, directive, condition):
+        if directive == "ifdef" or directive == "ifndef":
+            bDefined = condition.split()[0] in s.conditions.defines if condition else False
+            return bDefined == (directive == "ifdef")
+
+        try:
+            return bool(s.conditions.evaluate(condition))
+        except EvaluationError as e:
+            addWarning("condition", "Couldn't evaluate the condition, parsing it as true: %s" % e, s)
+            return True
+
     def parse_skippedlines(self, s):
         if s.struct and s.struct.name in g_SkippedStructs:
             self.parse_scope(s)
@@ -377,8 +1943,10 @@ class Parser:
         if "!defined(API_GEN)" in s.ifstatements:
             if s.line.startswith("#if"):
                 s.ifstatements.append("ugh")
+                s.branchconditions.append([[], "", 0])
             elif s.line.startswith("#endif"):
                 s.ifstatements.pop()
+                s.branchconditions.pop()
             return True
 
         if s.line.endswith("\\"):
@@ -389,9 +1957,8 @@ class Parser:
             s.bInMultilineMacro = False
             return True
 
-        for skip in g_SkippedLines:
-            if skip in s.line:
-                return True
+        if g_SkippedLinesRegex.search(s.line):
+            return True
 
         if not s.interface and 'inline' in s.line:
             return True
@@ -406,6 +1973,9 @@ class Parser:
             previf = s.ifstatements[-1]
             s.ifstatements.pop()
             s.ifstatements.append("!(" + previf + ") // #else")
+            branch = s.branchconditions[-1]
+            branch[1] = " && ".join("!(" + condition + ")" for condition in branch[0])
+            branch[2] += 1
         elif s.line.startswith("#include"):
             self.consume_comments(s)
             includefile = s.linesplit[1]
@@ -414,31 +1984,49 @@ class Parser:
         elif s.line.startswith("#ifdef"):
             token = s.linesplit[1]
             s.ifstatements.append("defined(" + token + ")")
+            s.branchconditions.append([[s.ifstatements[-1]], s.ifstatements[-1], 0])
         elif s.line.startswith("#ifndef"):
             token = s.linesplit[1]
             s.ifstatements.append("!defined(" + token + ")")
+            s.branchconditions.append([[s.ifstatements[-1]], s.ifstatements[-1], 0])
         elif s.line.startswith("#if"):
             s.ifstatements.append(s.line[3:].strip())
+            s.branchconditions.append([[s.ifstatements[-1]], s.ifstatements[-1], 0])
         elif s.line.startswith("#endif"):
             s.ifstatements.pop()
+            s.branchconditions.pop()
         elif s.line.startswith("#define"):
             comments = self.consume_comments(s)
+            # An include guard is defined for the rest of the file, so it isn't part of the pack conditions.
+            if s.branchconditions and s.branchconditions[-1][1] == "!defined(" + s.linesplit[1] + ")":
+                s.branchconditions[-1][1] = ""
             if Settings.warn_includeguardname:
                 if not s.ifstatements:
                     if s.linesplit[1] != s.f.name.upper().replace(".", "_"):
-                        printWarning("Include guard does not match the file name.", s)
+                        addWarning("includeguardname", "Include guard does not match the file name.", s)
 
             if len(s.linesplit) > 2:
                 spacing = s.line[s.line.index(s.linesplit[1]) + len(s.linesplit[1]):s.line.index(s.linesplit[2])]
                 s.f.defines.append(Define(s.linesplit[1], s.linesplit[2], spacing, comments))
             elif Settings.print_unuseddefines:
-                print("Unused Define: " + s.line)
+                addNote("unuseddefine", "Unused Define", s)
         elif s.line.startswith("#pragma pack"):
             if "push" in s.line:
                 tmpline = s.line[s.line.index(",")+1:-1].strip()
                 s.packsize.append(int(tmpline))
+                s.packconditions.append(" && ".join("(" + branch[1] + ")" for branch in s.branchconditions if branch[1]))
+                s.packbranches.append([(branch, branch[2]) for branch in s.branchconditions])
             elif "pop" in s.line:
-                s.packsize.pop
+                if s.packsize:
+                    s.packsize.pop()
+                    s.packconditions.pop()
+                    popped = s.packbranches.pop()
+                    # Every #if branch is parsed, so the pushes in the other branches of the same #if, like the
+                    # VALVE_CALLBACK_PACK_SMALL one before a VALVE_CALLBACK_PACK_LARGE one, are undone by this pop too.
+                    while s.packsize and _is_other_branch(s.packbranches[-1], popped):
+                        s.packsize.pop()
+                        s.packconditions.pop()
+                        s.packbranches.pop()
         elif s.line.startswith("#pragma"):
             pass
         elif s.line.startswith("#error"):
@@ -446,11 +2034,15 @@ class Parser:
         elif s.line.startswith("#warning"):
             pass
         elif s.line.startswith("#elif"):
-            pass
+            condition = s.line[5:].strip()
+            branch = s.branchconditions[-1]
+            branch[1] = " && ".join(["!(" + previous + ")" for previous in branch[0]] + ["(" + condition + ")"])
+            branch[0].append(condition)
+            branch[2] += 1
         elif s.line.startswith("#undef"):
             pass
         else:
-            printUnhandled("Preprocessor", s)
+            addUnhandled("preprocessor", "Preprocessor", s)
 
 
     def parse_typedefs(self, s):
@@ -462,19 +2054,19 @@ class Parser:
         # Skips typedefs in the Callback/CallResult classes
         if s.scopeDepth > 0:
             if Settings.print_skippedtypedefs:
-                print("Skipped typedef because it's in a class or struct: " + s.line)
+                addNote("skippedtypedef", "Skipped typedef because it's in a class or struct", s)
             return
 
         # Skips typedefs that we don't currently support, So far they are all function pointers.
         if "(" in s.line or "[" in s.line:
             if Settings.print_skippedtypedefs:
-                print("Skipped typedef because it contains '(' or '[': " + s.line)
+                addNote("skippedtypedef", "Skipped typedef because it contains '(' or '['", s)
             return
 
         # Currently skips typedef struct ValvePackingSentinel_t
         if not s.line.endswith(";"):
             if Settings.print_skippedtypedefs:
-                print("Skipped typedef because it does not end with ';': " + s.line)
+                addNote("skippedtypedef", "Skipped typedef because it does not end with ';'", s)
             return
 
         name = s.linesplit[-1].rstrip(";")
@@ -504,7 +2096,7 @@ class Parser:
         if "=" not in s.linesplit:
             return
 
-        result = re.match(".*const\s+(.*)\s+(\w+)\s+=\s+(.*);$", s.line)
+        result = g_ConstantRegex.match(s.line)
 
         if not result:
             return
@@ -548,7 +2140,7 @@ class Parser:
                 return
 
             if s.struct:
-                result = re.match("^enum { (.*) = (.*) };", s.line)
+                result = g_EnumConstantRegex.match(s.line)
                 name = result.group(1)
 
                 if name == "k_iCallback":
@@ -571,7 +2163,7 @@ class Parser:
         s.enum = Enum(s.linesplit[1], comments)
 
     def parse_enumfields(self, s):
-        result = re.match("^(\w+,?)([ \t]*)=?([ \t]*)(.*)$", s.line)
+        result = g_EnumFieldRegex.match(s.line)
         comments = self.consume_comments(s)
 
         # HACK: This is a hack for multiline fields :(
@@ -637,7 +2229,7 @@ class Parser:
         if s.scopeDepth != 0:
             return
 
-        s.struct = Struct(s.linesplit[1], s.packsize, comments)
+        s.struct = Struct(s.linesplit[1], list(s.packsize), comments, list(s.packconditions))
 
     def parse_struct_fields(self, s):
         comments = self.consume_comments(s)
@@ -649,9 +2241,9 @@ class Parser:
             return
 
         fieldarraysize = None
-        result = re.match("^([^=.]*\s\**)(\w+);$", s.line)
+        result = g_StructFieldRegex.match(s.line)
         if result is None:
-            result = re.match("^(.*\s\*?)(\w+)\[\s*(\w+)?\s*\];$", s.line)
+            result = g_StructArrayFieldRegex.match(s.line)
             if result is None:
                 return
 
@@ -669,7 +2261,7 @@ class Parser:
                 s.f.callbacks.append(s.callbackmacro)
                 s.callbackmacro = None
             elif s.line.startswith("STEAM_CALLBACK_MEMBER_ARRAY"):
-                result = re.match("^STEAM_CALLBACK_MEMBER_ARRAY\(.*,\s+(.*?)\s*,\s*(\w*)\s*,\s*(\d*)\s*\)", s.line)
+                result = g_CallbackMemberArrayRegex.match(s.line)
 
                 fieldtype = result.group(1)
                 fieldname = result.group(2)
@@ -677,7 +2269,7 @@ class Parser:
 
                 s.callbackmacro.fields.append(StructField(fieldname, fieldtype, fieldarraysize, comments))
             elif s.line.startswith("STEAM_CALLBACK_MEMBER"):
-                result = re.match("^STEAM_CALLBACK_MEMBER\(.*,\s+(.*?)\s*,\s*(\w*)\[?(\d+)?\]?\s*\)", s.line)
+                result = g_CallbackMemberRegex.match(s.line)
 
                 fieldtype = result.group(1)
                 fieldname = result.group(2)
@@ -686,7 +2278,7 @@ class Parser:
                 s.callbackmacro.fields.append(StructField(fieldname, fieldtype, fieldarraysize, comments))
             
             else:
-                printWarning("Unexpected line in Callback Macro")
+                addWarning("callbackmacro", "Unexpected line in Callback Macro", s)
 
             return
 
@@ -695,9 +2287,9 @@ class Parser:
 
         comments = self.consume_comments(s)
 
-        result = re.match("^STEAM_CALLBACK_BEGIN\(\s?(\w+),\s?(.*?)\s*\)", s.line)
+        result = g_CallbackBeginRegex.match(s.line)
 
-        s.callbackmacro = Struct(result.group(1), s.packsize, comments)
+        s.callbackmacro = Struct(result.group(1), list(s.packsize), comments, list(s.packconditions))
         s.callbackmacro.callbackid = result.group(2)
 
     def parse_interfaces(self, s):
@@ -714,6 +2306,9 @@ class Parser:
             self.parse_interface_functions(s)
 
     def parse_interface_function_atrributes(self, s):
+        if not s.line.startswith(g_FuncAttribs):
+            return
+
         for a in g_FuncAttribs:
             if s.line.startswith(a):
                 attr = FunctionAttribute()
@@ -786,7 +2381,7 @@ class Parser:
                     break
                 elif token[-1] != "(":  # Like f(void arg )
                     if Settings.warn_spacing:
-                        printWarning("Function is missing whitespace between the opening parentheses and first arg.", s)
+                        addWarning("spacing", "Function is missing whitespace between the opening parentheses and first arg.", s)
                     token = token.split("(")[1]
                     s.funcState = 2
                 else:
@@ -795,13 +2390,8 @@ class Parser:
 
             if s.funcState == 2:  # Args
                 # Strip clang attributes
-                bIsAttrib = False
-                for a in g_ArgAttribs:
-                    if token.startswith(a):
-                        attr = ArgAttribute()
-                        bIsAttrib = True
-                        break
-                if bIsAttrib:
+                if token.startswith(g_ArgAttribs):
+                    attr = ArgAttribute()
                     openparen_index = token.index("(")
                     attr.name = token[:openparen_index]
                     if len(token) > openparen_index+1:
@@ -844,7 +2434,7 @@ class Parser:
                     s.funcState = 3
                 elif token.endswith(")"):  # Like f( void "arg)"
                     if Settings.warn_spacing:
-                        printWarning("Function is missing whitespace between the closing parentheses and first arg.", s)
+                        addWarning("spacing", "Function is missing whitespace between the closing parentheses and first arg.", s)
 
                     arg = Arg()
                     arg.type = args.strip()
@@ -913,14 +2503,17 @@ class Parser:
 
         self.consume_comments(s)
 
-        #print("Skipped class: " + s.line)
+        # Only the name is kept, so that SymbolIndex.get_file can find classes like CSteamID.
+        # Forward declarations don't say where the class is defined.
+        if len(s.linesplit) > 1 and not s.line.endswith(";"):
+            s.f.classes.append(s.linesplit[1].split(":")[0].split("{")[0])
 
     def parse_scope(self, s):
         if "{" in s.line:
             s.scopeDepth += 1
 
             if s.line.count("{") > 1:
-                printWarning("Multiple occurences of '{'", s)
+                addWarning("scope", "Multiple occurences of '{'", s)
 
         if "}" in s.line:
             s.scopeDepth -= 1
@@ -930,13 +2523,27 @@ class Parser:
                 s.interface = None
 
             if s.scopeDepth < 0:
-                printWarning("scopeDepth is less than 0!", s)
+                addWarning("scope", "scopeDepth is less than 0!", s)
 
             if s.line.count("}") > 1:
-                printWarning("Multiple occurences of '}'", s)
+                addWarning("scope", "Multiple occurences of '}'", s)
+
+    def discard_comments(self, s):
+        # Drops the comments collected so far, like consume_comments without making a Comment.
+        s.commentstart = s.linenum + 1
+        s.rawcomments = []
+        s.comments = []
+        s.rawlinecomment = None
+        s.linecomment = None
 
     def consume_comments(self, s):
-        c = Comment(s.rawcomments, s.comments, s.rawlinecomment, s.linecomment)
+        if s.source is None:
+            c = Comment(s.rawcomments, s.comments, s.rawlinecomment, s.linecomment)
+        else:
+            c = LazyComment(s.source, s.commentstart, s.linenum)
+            s.commentstart = s.linenum + 1
+            if s.bInMultilineComment:
+                s.source.openlines.add(s.commentstart)
         s.rawcomments = []
         s.comments = []
         s.rawlinecomment = None
@@ -944,14 +2551,800 @@ class Parser:
         return c
 
 
-def printWarning(string, s):
-    print("[WARNING] " + string + " - In File: " + s.f.name + " - On Line " + str(s.linenum) + " - " + s.line)
+def intern_strings(f, strings):
+    """Replaces the type strings, attribute names and #if conditions in f with the equal ones already in strings
+
+    strings is a dict of each string to itself. The same few strings make up most of these, so sharing them saves
+    a str per Arg, StructField and Function, and comparing two equal ones is an identity check."""
+    intern = strings.setdefault
+    for t in f.typedefs:
+        t.type = intern(t.type, t.type)
+    for c in f.constants:
+        c.type = intern(c.type, c.type)
+    for struct in f.structs + f.callbacks:
+        for field in struct.fields:
+            field.type = intern(field.type, field.type)
+    for interface in f.interfaces:
+        for function in interface.functions:
+            function.returntype = intern(function.returntype, function.returntype)
+            if function.ifstatements:
+                function.ifstatements = intern(function.ifstatements, function.ifstatements)
+            for attr in function.attributes:
+                attr.name = intern(attr.name, attr.name)
+            for arg in function.args:
+                arg.type = intern(arg.type, arg.type)
+                if arg.attribute is not None:
+                    arg.attribute.name = intern(arg.attribute.name, arg.attribute.name)
+
+
+def get_file_key(folder, filename):
+    """Returns a key which only changes when the parse of a header could, see ParseCache and parse_many"""
+    h = hashlib.sha256()
+    h.update(str(PARSER_VERSION).encode())
+    # These are applied after the per file parse so they don't affect the result.
+    settings = get_settings()
+    settings.pop("fake_gameserver_interfaces", None)
+    settings.pop("print_diagnostics", None)
+    if settings["defines"] is not None:
+        settings["defines"] = sorted(normalize_defines(settings["defines"]).items())
+    h.update(repr(sorted(settings.items())).encode())
+    h.update(filename.encode())
+    with open(os.path.join(folder, filename), 'rb') as infile:
+        h.update(infile.read())
+    return h.hexdigest()
+
+
+def read_header(filepath):
+    """Returns the contents of a header decoded as latin-1 with any UTF8 BOM removed, and whether it had one"""
+    with open(filepath, 'rb') as infile:
+        try:
+            buf = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files can't be mapped.
+            data = infile.read()
+            bHasBOM = data[:3] == codecs.BOM_UTF8
+            return str(data[3:] if bHasBOM else data, "latin-1"), bHasBOM
+
+    with buf:
+        bHasBOM = buf[:3] == codecs.BOM_UTF8
+        # Decoded straight from the mapping, without an intermediate bytes copy.
+        with memoryview(buf) as view:
+            with view[3:] if bHasBOM else view[:] as contents:
+                text = str(contents, "latin-1")
+    return text, bHasBOM
+
+
+def tokenize(line, linenum=0):
+    """Splits a constant expression into Tokens in a single pass, see ExpressionEvaluator
+
+    The kinds are "identifier", "number", "string" and "punctuation". Comments are already stripped from the
+    lines the expressions come from."""
+    tokens = []
+    append = tokens.append
+    kinds = g_TokenKinds
+    pos = 0
+    for whitespace, text in g_TokenRegex.findall(line):
+        pos += len(whitespace)
+        kind = kinds.get(text[0], "punctuation")
+        # A '.' or an unmatched quote alone is punctuation, not the start of a number or string.
+        if len(text) == 1 and text in ".\"'":
+            kind = "punctuation"
+        append(Token(kind, text, linenum, pos))
+        pos += len(text)
+    return tokens
+
+
+def iter_lines(text):
+    """Yields the lines of text with the same line breaks as reading it in text mode
+
+    The lines don't keep their line break, apart from the '\r' of a '\r\n' which the parser strips along with
+    other trailing whitespace."""
+    if "\r" in text and text.count("\r") != text.count("\r\n"):
+        # Old Mac style lone '\r' line breaks, rare enough to not be worth avoiding the copies.
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    find = text.find
+    start = 0
+    end = find("\n")
+    while end != -1:
+        yield text[start:end]
+        start = end + 1
+        end = find("\n", start)
+
+    if start < len(text):
+        yield text[start:]
+
+
+def addWarning(code, string, s):
+    s.diagnostics.append(Diagnostic("WARNING", code, string, s.f.name, s.linenum, s.line))
+
+
+def addUnhandled(code, string, s):
+    s.diagnostics.append(Diagnostic("UNHANDLED", code, string, s.f.name, s.linenum, s.line))
+
+
+def addNote(code, string, s):
+    s.diagnostics.append(Diagnostic("INFO", code, string, s.f.name, s.linenum, s.line))
+
+
+# Methods that are timed and counted when instrumentation is enabled.
+g_InstrumentedStages = (
+    "parse_comments",
+    "parse_comments_multiline",
+    "parse_comments_singleline",
+    "parse_header",
+    "parse_conditions",
+    "parse_skippedlines",
+    "dispatch",
+    "parse_preprocessor",
+    "parse_typedefs",
+    "parse_constants",
+    "parse_enums",
+    "parse_enumfields",
+    "parse_structs",
+    "parse_struct_fields",
+    "parse_callbackmacros",
+    "parse_interfaces",
+    "parse_interface_function_atrributes",
+    "parse_interface_functions",
+    "parse_classes",
+    "parse_scope",
+    "consume_comments",
+)
+
+g_InstrumentedPatterns = (
+    "g_SkippedLinesRegex",
+    "g_ConstantRegex",
+    "g_EnumConstantRegex",
+    "g_EnumFieldRegex",
+    "g_StructFieldRegex",
+    "g_StructArrayFieldRegex",
+    "g_CallbackMemberArrayRegex",
+    "g_CallbackMemberRegex",
+    "g_CallbackBeginRegex",
+)
+
+# Sub-parsers that only ever act on lines starting with these tokens, see Parser.dispatch.
+g_TokenHandlers = {
+    "typedef": "parse_typedefs",
+    "const": "parse_constants",
+    "static": "parse_constants",
+}
+
+
+def get_settings():
+    """Returns a snapshot of the Settings flags"""
+    return {k: v for k, v in vars(Settings).items() if not k.startswith("_")}
+
+
+def apply_settings(settings):
+    """Restores Settings flags from a snapshot taken with get_settings()"""
+    for k, v in settings.items():
+        setattr(Settings, k, v)
+
+
+def _new_bare_parser(folder):
+    # A Parser that hasn't parsed anything, used to parse files one at a time.
+    parser = Parser.__new__(Parser)
+    parser.folder = folder
+    parser.workers = None
+    parser.cache = None
+    parser.shared = None
+    parser.strings = {}
+    parser.files = []
+    parser.typedefs = []
+    parser.gameserver_files = {}
+    parser.diagnostics = Diagnostics(printing=False)
+    return parser
+
+
+def _parse_file_worker(job):
+    folder, filename, settings, instrument = job
+    # Settings are class attributes, they are not inherited by spawned worker processes.
+    apply_settings(settings)
+    parser = _new_bare_parser(folder)
+    f = SteamFile(filename)
+    if not instrument:
+        return f, parser.parse_file(folder, f), None
+
+    parser.enable_instrumentation()
+    diagnostics = parser.parse_file(folder, f)
+    parser.stats.active = []
+    for stage in parser.stats.stages.values():
+        stage.lastline = None
+    return f, diagnostics, parser.stats
+
+
+def _parse_text_worker(job):
+    filename, text, bHasBOM, settings = job
+    apply_settings(settings)
+    f = SteamFile(filename)
+    return f, _new_bare_parser(None).parse_text(f, text, bHasBOM)
+
+
+async def _parse_file_async(loop, executor, folder, filename, settings):
+    # The read goes to the loop's default thread pool, the parse to executor.
+    text, bHasBOM = await loop.run_in_executor(None, read_header, os.path.join(folder, filename))
+    return await loop.run_in_executor(executor, _parse_text_worker, (filename, text, bHasBOM, settings))
+
+
+async def _iter_parsed_async(parser, executor):
+    # Yields (SteamFile, [Diagnostic]) for every header in the order they finish, see aiter_parse.
+    # Sets parser.filestats before anything is read.
+    loop = asyncio.get_running_loop()
+    bOwnsExecutor = executor is None
+    if bOwnsExecutor:
+        executor = concurrent.futures.ProcessPoolExecutor()
+
+    tasks = []
+    try:
+        parser.filestats = await loop.run_in_executor(None, parser.get_filestats)
+        settings = get_settings()
+        tasks = [loop.create_task(_parse_file_async(loop, executor, parser.folder, filename, settings))
+                 for filename in sorted(parser.filestats)]
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        # Only the files which haven't started parsing can be cancelled, the others are left to finish.
+        for task in tasks:
+            task.cancel()
+        if bOwnsExecutor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_parse(folder, executor=None, diagnostics=None):
+    """Async version of iter_parse, yields each SteamFile as soon as it has been parsed, in the order they finish
+
+    Headers are read in the event loop's default executor and parsed in executor, a ProcessPoolExecutor of
+    its own by default, so the loop isn't blocked. Cancelling the iterating task, or stopping early, cancels
+    the files which haven't been parsed yet. The GameServer copies are yielded right after their original.
+    Warnings are added to diagnostics, a printing Diagnostics by default."""
+    if diagnostics is None:
+        diagnostics = Diagnostics()
+    parser = _new_bare_parser(folder)
+    parsed = _iter_parsed_async(parser, executor)
+    try:
+        async for f, records in parsed:
+            diagnostics.extend(records)
+            yield f
+            if Settings.fake_gameserver_interfaces and f.name in g_GameServerInterfaces:
+                yield parser.make_gameserver_file(f)
+    finally:
+        await parsed.aclose()
+
+
+async def parse_async(folder, executor=None, diagnostics=None):
+    """Async version of parse, returns the same Parser without blocking the event loop, see aiter_parse"""
+    parser = _new_bare_parser(folder)
+    parsed = {}
+    async for f, records in _iter_parsed_async(parser, executor):
+        parsed[f.name] = (f, records)
+
+    if diagnostics is None:
+        diagnostics = Diagnostics()
+    parser.diagnostics = diagnostics
+    for name in sorted(parsed):
+        f, records = parsed[name]
+        intern_strings(f, parser.strings)
+        diagnostics.extend(records)
+        parser.files.append(f)
+    parser.typedefs = [t for f in parser.files for t in f.typedefs]
+
+    if Settings.fake_gameserver_interfaces:
+        for f in [f for f in parser.files if f.name in g_GameServerInterfaces]:
+            gs_f = parser.make_gameserver_file(f)
+            parser.gameserver_files[f.name] = gs_f
+            parser.files.append(gs_f)
+    return parser
+
+
+def parse(folder, workers=None, cache=None, instrument=False, diagnostics=None):
+    """Parses the Steamworks headers contained in a folder
+
+    If workers is greater than 1 the headers are parsed in a pool of that many processes.
+    cache can be a directory path or a ParseCache, unchanged files are then loaded from it instead of being parsed.
+    If instrument is True, per file and per stage timings and counters are collected into Parser.stats.
+    Warnings end up in Parser.diagnostics, pass a Diagnostics to control how they are deduplicated and printed."""
+    return Parser(folder, workers, cache, instrument, diagnostics)
+
+
+def parse_many(folders, workers=None, cache=None, instrument=False):
+    """Parses several SDK folders, like every SDK version, and returns a Parser for each of them in the same order
+
+    Each distinct header, by name and contents, is only parsed once. Folders that share it get the same SteamFile
+    object, so treat the model as read only or changes show up in every Parser which has the file.
+    The other arguments are the same as for parse, each Parser collects its own Diagnostics."""
+    if cache is not None and not isinstance(cache, ParseCache):
+        cache = ParseCache(cache)
+
+    shared = {}
+    strings = {}
+    return [Parser(folder, workers, cache, instrument, shared=shared, strings=strings) for folder in folders]
+
+
+def iter_parse(folder, diagnostics=None):
+    """Parses the Steamworks headers contained in a folder, yielding each SteamFile as soon as it has been parsed
+
+    Files are yielded in the same order as Parser.files, the GameServer copies come last.
+    Nothing is retained between files apart from the GameServer copies which haven't been yielded yet.
+    Warnings are added to diagnostics, a printing Diagnostics by default."""
+    if diagnostics is None:
+        diagnostics = Diagnostics()
+    parser = _new_bare_parser(folder)
+    gs_files = []
+    for filename in sorted(parser.get_filestats()):
+        f = SteamFile(filename)
+        parser.typedefs = []
+        diagnostics.extend(parser.parse_file(folder, f))
+
+        if Settings.fake_gameserver_interfaces and f.name in g_GameServerInterfaces:
+            gs_files.append(parser.make_gameserver_file(f))
+
+        yield f
+
+    for gs_f in gs_files:
+        yield gs_f
+
+
+# Bump whenever the exported layout changes.
+EXPORT_VERSION = 3
+
+# Attributes written by export_model for each class, and the class their values are made of.
+# None means the value is a plain string, number, bool or a list of them.
+g_ExportSchema = {
+    SteamFile: (
+        ("name", None),
+        ("header", None),
+        ("includes", None),
+        ("defines", Define),
+        ("constants", Constant),
+        ("enums", Enum),
+        ("structs", Struct),
+        ("callbacks", Struct),
+        ("interfaces", Interface),
+        ("typedefs", Typedef),
+        ("classes", None),
+    ),
+    Define: (("name", None), ("value", None), ("spacing", None), ("c", Comment)),
+    Constant: (("name", None), ("value", None), ("type", None), ("c", Comment)),
+    Enum: (("name", None), ("fields", EnumField), ("c", Comment), ("endcomments", Comment)),
+    EnumField: (("name", None), ("value", None), ("prespacing", None), ("postspacing", None), ("c", Comment)),
+    Struct: (
+        ("name", None),
+        ("packsize", None),
+        ("packconditions", None),
+        ("c", Comment),
+        ("fields", StructField),
+        ("callbackid", None),
+        ("endcomments", Comment),
+    ),
+    StructField: (("name", None), ("type", None), ("arraysize", None), ("c", Comment)),
+    Interface: (("name", None), ("functions", Function), ("c", Comment)),
+    Function: (
+        ("name", None),
+        ("returntype", None),
+        ("args", Arg),
+        ("ifstatements", None),
+        ("comments", None),
+        ("linecomment", None),
+        ("attributes", FunctionAttribute),
+        ("private", None),
+    ),
+    FunctionAttribute: (("name", None), ("value", None)),
+    Arg: (("name", None), ("type", None), ("default", None), ("attribute", ArgAttribute)),
+    ArgAttribute: (("name", None), ("value", None)),
+    Typedef: (("name", None), ("type", None), ("filename", None), ("c", Comment)),
+    # BlankLine entries in rawprecomments are written as null.
+    Comment: (("rawprecomments", BlankLine), ("precomments", None), ("rawlinecomment", None), ("linecomment", None)),
+}
+
+
+def _to_data(o, cls):
+    if o is None:
+        return None
+    if isinstance(o, list):
+        return [_to_data(x, cls) for x in o]
+    if cls is None:
+        return o
+    if cls is BlankLine:
+        return None if isinstance(o, BlankLine) else o
+    return {name: _to_data(getattr(o, name), fieldcls) for name, fieldcls in g_ExportSchema[cls]}
+
+
+def _from_data(data, cls):
+    if isinstance(data, list):
+        return [_from_data(x, cls) for x in data]
+    if cls is BlankLine:
+        return BlankLine() if data is None else data
+    if data is None or cls is None:
+        return data
+    o = cls.__new__(cls)
+    for name, fieldcls in g_ExportSchema[cls]:
+        setattr(o, name, _from_data(data[name], fieldcls))
+    return o
+
+
+def _get_export_header(parser):
+    return {
+        "version": EXPORT_VERSION,
+        # Name of each GameServer copy -> name of the file it was made from.
+        "gameserver_files": {gs_f.name: name for name, gs_f in (parser.gameserver_files or {}).items()},
+    }
+
+
+def export_model(parser, fp, format="json"):
+    """Writes the whole parsed model to a file object, one SteamFile at a time
+
+    format is "json", which needs a text file object, or "msgpack", which needs a binary one and the msgpack package.
+    load_model reads it back."""
+    header = _get_export_header(parser)
+
+    if format == "json":
+        encoder = json.JSONEncoder(separators=(",", ":"))
+        fp.write('{"version":%d,"gameserver_files":%s,"files":[' % (header["version"], encoder.encode(header["gameserver_files"])))
+        for i, f in enumerate(parser.files):
+            if i:
+                fp.write(",\n")
+            for chunk in encoder.iterencode(_to_data(f, SteamFile)):
+                fp.write(chunk)
+        fp.write("]}\n")
+    elif format == "msgpack":
+        import msgpack
+        packer = msgpack.Packer()
+        fp.write(packer.pack_map_header(3))
+        fp.write(packer.pack("version"))
+        fp.write(packer.pack(header["version"]))
+        fp.write(packer.pack("gameserver_files"))
+        fp.write(packer.pack(header["gameserver_files"]))
+        fp.write(packer.pack("files"))
+        fp.write(packer.pack_array_header(len(parser.files)))
+        for f in parser.files:
+            fp.write(packer.pack(_to_data(f, SteamFile)))
+    else:
+        raise ValueError("Unknown export format: " + format)
+
+
+def load_model(fp, format="json"):
+    """Reads a model written by export_model back into a Parser, without parsing anything"""
+    if format == "json":
+        data = json.load(fp)
+    elif format == "msgpack":
+        import msgpack
+        data = msgpack.unpack(fp, raw=False)
+    else:
+        raise ValueError("Unknown export format: " + format)
+
+    if data["version"] != EXPORT_VERSION:
+        raise ValueError("Unsupported export version: " + str(data["version"]))
+
+    parser = _new_bare_parser(None)
+    parser.files = [_from_data(f, SteamFile) for f in data["files"]]
+    for f in parser.files:
+        intern_strings(f, parser.strings)
+
+    files = {f.name: f for f in parser.files}
+    gs_names = set(data["gameserver_files"])
+    for gs_name, name in data["gameserver_files"].items():
+        # Remade from the original file so that the functions are shared again.
+        parser.gameserver_files[name] = parser.make_gameserver_file(files[name])
+    gs_files = {gs_f.name: gs_f for gs_f in parser.gameserver_files.values()}
+    parser.files = [gs_files.get(f.name, f) if f.name in gs_names else f for f in parser.files]
+    parser.typedefs = [t for f in parser.files if f.name not in gs_names for t in f.typedefs]
+    return parser
+
+
+class Change:
+    __slots__ = ("kind", "entity", "name", "old", "new", "fields")
+
+    def __init__(self, kind, entity, name, old, new, fields=()):
+        self.kind = kind  # "added", "removed", "changed", "renamed" or "moved"
+        self.entity = entity  # "interface", "function", "arg", "enum", "enumfield", "struct", "callback", "field", "constant", "define" or "typedef"
+        self.name = name  # Qualified name in the new SDK, or the old one when removed. Like "ISteamApps::GetAppData"
+        self.old = old  # Entity from the old Parser, None when added
+        self.new = new  # Entity from the new Parser, None when removed
+        self.fields = fields  # Attributes which differ when changed
+
+    def __str__(self):
+        s = self.kind + " " + self.entity + " " + self.name
+        if self.kind == "renamed":
+            s += " (was " + self.old.name + ")"
+        if self.fields:
+            s += ": " + ", ".join(self.fields)
+        return s
+
+class Changeset:
+    """The differences between two Parsers found by diff_parsers, in the order of the new SDK"""
+
+    def __init__(self):
+        self.changes = []  # Change
+
+    def __len__(self):
+        return len(self.changes)
+
+    def __iter__(self):
+        return iter(self.changes)
+
+    def add(self, kind, entity, name, old, new, fields=()):
+        self.changes.append(Change(kind, entity, name, old, new, fields))
+
+    def query(self, kind=None, entity=None, name=None):
+        return [c for c in self.changes if (kind is None or c.kind == kind) and (entity is None or c.entity == entity) and (name is None or c.name == name)]
+
+    def format(self):
+        return "\n".join(str(c) for c in self.changes)
+
+# Attributes compared for each kind of entity, the children are matched and compared on their own.
+# Comments and spacing are only compared when asked to.
+g_DiffAttributes = {
+    "interface": (),
+    "function": ("returntype", "attributes", "private", "ifstatements"),
+    "arg": ("name", "type", "default", "attribute"),
+    "enum": (),
+    "enumfield": ("value",),
+    "struct": ("packsize", "callbackid"),
+    "callback": ("packsize", "callbackid"),
+    "field": ("type", "arraysize"),
+    "constant": ("type", "value"),
+    "define": ("value",),
+    "typedef": ("type",),
+}
+
+g_DiffSpacingAttributes = {
+    "enumfield": ("prespacing", "postspacing"),
+    "define": ("spacing",),
+}
+
+g_DiffCommentAttributes = {
+    "interface": ("c",),
+    "function": ("comments", "linecomment"),
+    "enum": ("c", "endcomments"),
+    "enumfield": ("c",),
+    "struct": ("c", "endcomments"),
+    "callback": ("c", "endcomments"),
+    "field": ("c",),
+    "constant": ("c",),
+    "define": ("c",),
+    "typedef": ("c",),
+}
+
+# Child lists and the kind of entity in them. Their order matters, so moves are reported.
+g_DiffChildren = {
+    "interface": ("functions", "function"),
+    "enum": ("fields", "enumfield"),
+    "struct": ("fields", "field"),
+    "callback": ("fields", "field"),
+}
+
+# Kinds of entities that are matched by their structure when their name isn't found on the other side.
+g_DiffRenamable = ("interface", "function", "enum", "struct", "callback")
+
+g_DiffScalars = (str, int, bool, type(None))
+
+def _get_attributes(names):
+    # Like operator.attrgetter but always returns a tuple.
+    if not names:
+        return lambda o: ()
+    if len(names) == 1:
+        getter = operator.attrgetter(names[0])
+        return lambda o: (getter(o),)
+    return operator.attrgetter(*names)
+
+def _diff_value(o):
+    # Plain hashable form of an attribute value.
+    if isinstance(o, list):
+        return tuple(_diff_value(x) for x in o)
+    if isinstance(o, (FunctionAttribute, ArgAttribute)):
+        return (o.name, o.value)
+    if isinstance(o, Comment):
+        return (tuple(o.precomments), o.linecomment)
+    return o
+
+class Differ:
+    """Compares two Parsers entity by entity, see diff_parsers
+
+    Every entity gets a fingerprint of its structure, without its name, which also covers its children. Entities
+    are matched through dicts, first by name and fingerprint, then by name, and for the kinds in g_DiffRenamable
+    by a fingerprint that is unique on both sides, which finds renames. Matching identical entities never looks
+    at their children, so diffing two mostly identical SDKs is quick."""
+
+    def __init__(self, comments=False, spacing=False):
+        self.attributes = {}
+        for entity, names in g_DiffAttributes.items():
+            if spacing:
+                names += g_DiffSpacingAttributes.get(entity, ())
+            if comments:
+                names += g_DiffCommentAttributes.get(entity, ())
+            self.attributes[entity] = names
+        self.getters = {entity: _get_attributes(names) for entity, names in self.attributes.items()}
+        self.fingerprints = {}  # id(entity) -> fingerprint
+        self.numbers = {}  # Tuple of values -> fingerprint
+        self.changes = None
+
+    def get_fingerprint(self, o, entity):
+        fp = self.fingerprints.get(id(o))
+        if fp is None:
+            values = [v if type(v) in g_DiffScalars else _diff_value(v) for v in self.getters[entity](o)]
+            if entity == "function":
+                values.extend(self.get_fingerprint(a, "arg") for a in o.args)
+            elif entity in g_DiffChildren:
+                children, childentity = g_DiffChildren[entity]
+                for c in getattr(o, children):
+                    values.append(c.name)
+                    values.append(self.get_fingerprint(c, childentity))
+            # Numbered so that the fingerprints of parents stay flat and cheap to hash and compare.
+            values = tuple(values)
+            fp = self.numbers.get(values)
+            if fp is None:
+                fp = len(self.numbers)
+                self.numbers[values] = fp
+            self.fingerprints[id(o)] = fp
+        return fp
+
+    def get_entities(self, parser):
+        entities = {name: [] for name in ("interface", "enum", "struct", "callback", "constant", "define", "typedef")}
+        gs_files = set(id(f) for f in (parser.gameserver_files or {}).values())
+        for f in parser.files:
+            if id(f) in gs_files:
+                continue
+            entities["interface"].extend(f.interfaces)
+            entities["enum"].extend(f.enums)
+            entities["struct"].extend(f.structs)
+            entities["callback"].extend(f.callbacks)
+            entities["constant"].extend(f.constants)
+            entities["define"].extend(f.defines)
+            entities["typedef"].extend(f.typedefs)
+        return entities
+
+    def match(self, old, new, entity):
+        """Returns [(old, new)] in the order of new, and the unmatched old and new entities"""
+        fingerprint = self.get_fingerprint
+        pairs = {}  # id(new) -> old
+        oldleft = old
+
+        for key in (lambda o: (o.name, fingerprint(o, entity)), lambda o: o.name):
+            candidates = {}
+            for n in reversed(new):
+                if id(n) not in pairs:
+                    candidates.setdefault(key(n), []).append(n)
+            remaining = []
+            for o in oldleft:
+                found = candidates.get(key(o))
+                if found:
+                    pairs[id(found.pop())] = o
+                else:
+                    remaining.append(o)
+            oldleft = remaining
+
+        if entity in g_DiffRenamable and oldleft:
+            newleft = {}
+            for n in new:
+                if id(n) not in pairs:
+                    newleft.setdefault(fingerprint(n, entity), []).append(n)
+            oldcounts = {}
+            for o in oldleft:
+                fp = fingerprint(o, entity)
+                oldcounts[fp] = oldcounts.get(fp, 0) + 1
+            remaining = []
+            for o in oldleft:
+                fp = fingerprint(o, entity)
+                found = newleft.get(fp)
+                if found is not None and len(found) == 1 and oldcounts[fp] == 1:
+                    pairs[id(found[0])] = o
+                else:
+                    remaining.append(o)
+            oldleft = remaining
+
+        matched = [(pairs[id(n)], n) for n in new if id(n) in pairs]
+        added = [n for n in new if id(n) not in pairs]
+        return matched, oldleft, added
+
+    def diff_list(self, old, new, entity, prefix, ordered):
+        matched, removed, added = self.match(old, new, entity)
+
+        moved = set()
+        if ordered:
+            moved = _get_moved(matched, old)
+
+        for o in removed:
+            self.changes.add("removed", entity, prefix + o.name, o, None)
+
+        for o, n in matched:
+            name = prefix + n.name
+            if o.name != n.name:
+                self.changes.add("renamed", entity, name, o, n)
+            if id(o) in moved:
+                self.changes.add("moved", entity, name, o, n)
+            if self.get_fingerprint(o, entity) != self.get_fingerprint(n, entity):
+                self.diff_entity(o, n, entity, name)
+
+        for n in added:
+            self.changes.add("added", entity, prefix + n.name, None, n)
+
+    def diff_entity(self, old, new, entity, name):
+        fields = [a for a in self.attributes[entity] if _diff_value(getattr(old, a)) != _diff_value(getattr(new, a))]
+
+        if entity == "function":
+            oldargs = tuple(self.get_fingerprint(a, "arg") for a in old.args)
+            newargs = tuple(self.get_fingerprint(a, "arg") for a in new.args)
+            if oldargs != newargs:
+                fields.append("args")
+        elif entity in g_DiffChildren:
+            children = g_DiffChildren[entity][0]
+            oldchildren = [(c.name, self.get_fingerprint(c, g_DiffChildren[entity][1])) for c in getattr(old, children)]
+            newchildren = [(c.name, self.get_fingerprint(c, g_DiffChildren[entity][1])) for c in getattr(new, children)]
+            if oldchildren != newchildren:
+                fields.append(children)
+
+        if fields:
+            self.changes.add("changed", entity, name, old, new, tuple(fields))
+
+        if entity == "function":
+            self.diff_args(old, new, name)
+        elif entity in g_DiffChildren:
+            children, childentity = g_DiffChildren[entity]
+            separator = "::" if entity == "interface" else "."
+            self.diff_list(getattr(old, children), getattr(new, children), childentity, name + separator, True)
+
+    def diff_args(self, old, new, name):
+        # Args are matched by position, a different name is a change to the arg.
+        for i in range(max(len(old.args), len(new.args))):
+            if i >= len(new.args):
+                self.changes.add("removed", "arg", name + "(" + old.args[i].name + ")", old.args[i], None)
+            elif i >= len(old.args):
+                self.changes.add("added", "arg", name + "(" + new.args[i].name + ")", None, new.args[i])
+            else:
+                o = old.args[i]
+                n = new.args[i]
+                if self.get_fingerprint(o, "arg") != self.get_fingerprint(n, "arg"):
+                    fields = tuple(a for a in self.attributes["arg"] if _diff_value(getattr(o, a)) != _diff_value(getattr(n, a)))
+                    self.changes.add("changed", "arg", name + "(" + n.name + ")", o, n, fields)
+
+    def diff(self, old, new):
+        self.changes = Changeset()
+        oldentities = self.get_entities(old)
+        newentities = self.get_entities(new)
+        for entity in oldentities:
+            self.diff_list(oldentities[entity], newentities[entity], entity, "", False)
+        self.fingerprints = {}
+        self.numbers = {}
+        return self.changes
+
+def _get_moved(matched, old):
+    # The old entities which have to move to get from the old order to the new one, the ones which are not
+    # part of the longest increasing run of old positions. O(n log n).
+    positions = {id(o): i for i, o in enumerate(old)}
+    sequence = [positions[id(o)] for o, n in matched]
+
+    tails = []  # Index into sequence of the smallest tail of each run length
+    previous = [-1] * len(sequence)
+    for i, pos in enumerate(sequence):
+        lo = 0
+        hi = len(tails)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if sequence[tails[mid]] < pos:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo > 0:
+            previous[i] = tails[lo - 1]
+        if lo == len(tails):
+            tails.append(i)
+        else:
+            tails[lo] = i
+
+    inorder = set()
+    i = tails[-1] if tails else -1
+    while i != -1:
+        inorder.add(i)
+        i = previous[i]
 
+    return set(id(matched[i][0]) for i in range(len(matched)) if i not in inorder)
 
-def printUnhandled(string, s):
-    print("[UNHANDLED] " + string + " - In File: " + s.f.name + " - On Line " + str(s.linenum) + " - " + s.line)
 
+def diff_parsers(old, new, comments=False, spacing=False):
+    """Returns a Changeset of every interface, function, arg, enum, enum field, struct, callback, field, constant,
+    define and typedef that was added, removed, changed, renamed or moved between two Parsers
 
-def parse(folder):
-    """Parses the Steamworks headers contained in a folder"""
-    return Parser(folder)
+    Comments and whitespace differences are ignored unless comments or spacing are True."""
+    return Differ(comments, spacing).diff(old, new)
@@ -0,0 +1,282 @@
+"""Writes a deterministic synthetic Steamworks SDK for benchmarking steamworksparser
+
+The headers imitate the layout of the real isteam*.h headers closely enough to exercise every sub-parser:
+interfaces with STEAM_* function and arg attributes, STEAM_CALLBACK_BEGIN blocks, packed structs and callbacks,
+enums with comments, nested #ifdef blocks and multiline macros.
+
+Usage: python syntheticsdk.py <output folder> [--files N] [--scale N] [--seed N]
+"""
+import argparse
+import os
+import random
+
+g_Types = (
+    "bool",
+    "int",
+    "int32",
+    "uint8",
+    "uint16",
+    "uint32",
+    "uint64",
+    "float",
+    "double",
+    "CSteamID",
+    "AppId_t",
+    "SteamAPICall_t",
+    "HSteamPipe",
+    "EResult",
+)
+
+g_Platforms = (
+    "_WIN32",
+    "_PS3",
+    "POSIX",
+    "STEAM_API_EXPORTS",
+)
+
+class SyntheticHeader:
+    def __init__(self, rand, filenum, scale):
+        self.rand = rand
+        self.filenum = filenum
+        self.scale = scale
+        self.name = "isteamsynthetic%d" % filenum
+        self.lines = []
+
+    def w(self, line=""):
+        self.lines.append(line)
+
+    def get_type(self):
+        return self.rand.choice(g_Types)
+
+    def write(self):
+        guard = self.name.upper() + "_H"
+        self.w("//====== Copyright Valve Corporation, All rights reserved. ====================")
+        self.w("//")
+        self.w("// Purpose: Synthetic interface %d" % self.filenum)
+        self.w("//")
+        self.w("//=============================================================================")
+        self.w()
+        self.w("#ifndef " + guard)
+        self.w("#define " + guard)
+        self.w("#ifdef _WIN32")
+        self.w("#pragma once")
+        self.w("#endif")
+        self.w()
+        self.w('#include "steam_api_common.h"')
+        self.w()
+
+        self.write_typedefs()
+        self.write_constants()
+        for i in range(max(1, self.scale // 25)):
+            self.write_enum(i)
+        self.write_macro()
+        self.write_interface()
+        self.write_structs()
+        self.write_callbacks()
+
+        self.w("#endif // " + guard)
+        return "\n".join(self.lines) + "\n"
+
+    def write_typedefs(self):
+        for i in range(self.scale):
+            name = "Synthetic%dHandle%d_t" % (self.filenum, i)
+            if i % 10 == 0:
+                self.w("#ifdef %s" % self.rand.choice(g_Platforms))
+                self.w("typedef %s %s;" % (self.get_type(), name))
+                self.w("#else")
+                self.w("typedef %s %s;" % (self.get_type(), name))
+                self.w("#endif")
+            else:
+                self.w("// Handle type %d" % i)
+                self.w("typedef %s %s;" % (self.rand.choice(("uint32", "uint64", "int32", "void *", "Synthetic%dHandle0_t" % self.filenum)), name))
+        self.w()
+
+    def write_constants(self):
+        for i in range(self.scale):
+            kind = i % 4
+            if kind == 0:
+                self.w("const uint32 k_unSynthetic%dConstant%d = 0x%x;" % (self.filenum, i, self.rand.randint(0, 0xffffffff)))
+            elif kind == 1:
+                self.w("static const int k_nSynthetic%dConstant%d = %d; // Line comment" % (self.filenum, i, self.rand.randint(-100, 100)))
+            elif kind == 2:
+                self.w("enum { k_cchSynthetic%dConstant%d = %d };" % (self.filenum, i, self.rand.randint(1, 4096)))
+            else:
+                self.w("#define SYNTHETIC%d_DEFINE%d\t\t%d" % (self.filenum, i, i))
+        self.w()
+
+    def write_enum(self, enumnum):
+        self.w("//-----------------------------------------------------------------------------")
+        self.w("// Purpose: Synthetic enum %d" % enumnum)
+        self.w("//-----------------------------------------------------------------------------")
+        self.w("enum ESynthetic%dEnum%d" % (self.filenum, enumnum))
+        self.w("{")
+        prefix = "k_ESynthetic%dEnum%d" % (self.filenum, enumnum)
+        for i in range(25):
+            if i % 7 == 3:
+                self.w()
+                self.w("\t// Precomment for field %d" % i)
+            if i % 11 == 5:
+                self.w("\t/* Multiline comment")
+                self.w("\t   for field %d */" % i)
+            if i == 24:
+                self.w("\t%sMax = %sField%d + 1," % (prefix, prefix, i - 1))
+            elif i % 5 == 4:
+                self.w("\t%sFlag%d = ( 1 << %d ),\t// Flag %d" % (prefix, i, i, i))
+            else:
+                self.w("\t%sField%d = %d,\t\t\t\t// Field comment %d" % (prefix, i, i, i))
+        self.w("};")
+        self.w()
+
+    def write_macro(self):
+        self.w("#define SYNTHETIC%d_MACRO( a, b ) \\" % self.filenum)
+        self.w("\tdo { \\")
+        self.w("\t\ta = b; \\")
+        self.w("\t} while ( 0 )")
+        self.w()
+
+    def write_args(self, i):
+        args = []
+        for a in range(i % 6):
+            kind = (i + a) % 9
+            name = "arg%d" % a
+            if kind == 0:
+                args.append("%s %s" % (self.get_type(), name))
+            elif kind == 1:
+                args.append("const char *pch%s" % name)
+            elif kind == 2:
+                args.append("STEAM_OUT_STRING_COUNT( cch%s ) char *pch%s, int cch%s" % (name, name, name))
+            elif kind == 3:
+                args.append("STEAM_ARRAY_COUNT(c%s) %s *p%s, uint32 c%s" % (name, self.get_type(), name, name))
+            elif kind == 4:
+                args.append("STEAM_OUT_BUFFER_COUNT( cub%s ) void *p%s, uint32 cub%s" % (name, name, name))
+            elif kind == 5:
+                args.append("STEAM_DESC(Some description of %s) %s %s" % (name, self.get_type(), name))
+            elif kind == 6:
+                args.append("STEAM_OUT_STRUCT() %s *p%s" % (self.get_type(), name))
+            elif kind == 7:
+                args.append("const %s &r%s" % (self.get_type(), name))
+            else:
+                args.append("%s **pp%s" % (self.get_type(), name))
+        if i % 13 == 12:
+            args.append("int nDefault = 0")
+        if not args:
+            return "()"
+        return "( " + ", ".join(args) + " )"
+
+    def write_interface(self):
+        self.w("//-----------------------------------------------------------------------------")
+        self.w("// Purpose: Synthetic interface %d" % self.filenum)
+        self.w("//-----------------------------------------------------------------------------")
+        self.w("class ISteamSynthetic%d" % self.filenum)
+        self.w("{")
+        self.w("public:")
+        for i in range(self.scale):
+            if i % 20 == 10:
+                self.w("#ifdef %s" % self.rand.choice(g_Platforms))
+                self.w("#ifndef %s" % self.rand.choice(g_Platforms))
+            self.w("\t// Does synthetic thing %d" % i)
+            if i % 8 == 1:
+                self.w("\t// with a second line of comments")
+            if i % 3 == 0:
+                self.w("\tSTEAM_CALL_RESULT( Synthetic%dCallback%d_t )" % (self.filenum, i))
+            elif i % 7 == 2:
+                self.w("\tSTEAM_METHOD_DESC(Does the synthetic thing %d)" % i)
+            elif i % 11 == 4:
+                self.w("\tSTEAM_FLAT_NAME( FunctionFlat%d )" % i)
+            returntype = self.rand.choice(("bool", "void", "uint32", "SteamAPICall_t", "const char *", "CSteamID"))
+            # Like the real headers the pointer sticks to the name, "const char *GetName()"
+            line = "virtual %s%sFunction%d%s = 0;" % (returntype, "" if returntype.endswith("*") else " ", i, self.write_args(i))
+            if i % 17 == 9:
+                line = "STEAM_PRIVATE_API( %s )" % line
+            if i % 19 == 7:
+                line += " // Trailing comment"
+            self.w("\t" + line)
+            if i % 20 == 10:
+                self.w("#endif")
+                self.w("#endif")
+            self.w()
+        self.w("};")
+        self.w()
+        self.w('#define STEAMSYNTHETIC%d_INTERFACE_VERSION "SteamSynthetic%d001"' % (self.filenum, self.filenum))
+        self.w()
+
+    def write_fields(self, count):
+        for f in range(count):
+            kind = f % 5
+            if kind == 0:
+                self.w("\tEResult m_eResult;\t// The result of the operation")
+            elif kind == 1:
+                self.w("\tchar m_rgchField%d[ %d ];" % (f, self.rand.choice((32, 64, 128, 256))))
+            elif kind == 2:
+                self.w("\tconst char *m_pchField%d;" % f)
+            elif kind == 3:
+                self.w("\t// Field %d" % f)
+                self.w("\t%s m_Field%d;" % (self.get_type(), f))
+            else:
+                self.w("\tuint8 m_rgubField%d[k_cubSyntheticMax];" % f)
+
+    def write_structs(self):
+        self.w("#pragma pack( push, %d )" % self.rand.choice((1, 4, 8)))
+        for i in range(max(1, self.scale // 5)):
+            self.w("// Packed struct %d" % i)
+            self.w("struct Synthetic%dStruct%d_t" % (self.filenum, i))
+            self.w("{")
+            self.write_fields(3 + i % 5)
+            self.w("};")
+            self.w()
+        self.w("#pragma pack( pop )")
+        self.w()
+
+    def write_callbacks(self):
+        self.w("#if defined( VALVE_CALLBACK_PACK_SMALL )")
+        self.w("#pragma pack( push, 4 )")
+        self.w("#elif defined( VALVE_CALLBACK_PACK_LARGE )")
+        self.w("#pragma pack( push, 8 )")
+        self.w("#else")
+        self.w("#error steam_api_common.h should define VALVE_CALLBACK_PACK_xxx")
+        self.w("#endif")
+        self.w()
+        for i in range(self.scale):
+            if i % 4 == 3:
+                self.w("STEAM_CALLBACK_BEGIN( Synthetic%dCallback%d_t, k_iSteamSynthetic%dCallbacks + %d )" % (self.filenum, i, self.filenum, i))
+                self.w("\tSTEAM_CALLBACK_MEMBER( 0, EResult, m_eResult )\t// Result")
+                self.w("\tSTEAM_CALLBACK_MEMBER( 1, CSteamID, m_steamID )")
+                self.w("\tSTEAM_CALLBACK_MEMBER_ARRAY( 2, char, m_rgchName, 32 )")
+                self.w("STEAM_CALLBACK_END(3)")
+            else:
+                self.w("//-----------------------------------------------------------------------------")
+                self.w("// Purpose: Synthetic callback %d" % i)
+                self.w("//-----------------------------------------------------------------------------")
+                self.w("struct Synthetic%dCallback%d_t" % (self.filenum, i))
+                self.w("{")
+                self.w("\tenum { k_iCallback = k_iSteamSynthetic%dCallbacks + %d };" % (self.filenum, i))
+                self.write_fields(1 + i % 4)
+                self.w("};")
+            self.w()
+        self.w("#pragma pack( pop )")
+        self.w()
+
+def write_sdk(folder, numfiles=20, scale=50, seed=0):
+    """Writes numfiles synthetic headers into folder, each with roughly scale entities of every kind
+
+    The output only depends on the arguments."""
+    os.makedirs(folder, exist_ok=True)
+    for filenum in range(numfiles):
+        rand = random.Random("%d-%d" % (seed, filenum))
+        header = SyntheticHeader(rand, filenum, scale)
+        contents = header.write()
+        with open(os.path.join(folder, header.name + ".h"), "w", encoding="latin-1", newline="\n") as out:
+            out.write(contents)
+
+def main():
+    argparser = argparse.ArgumentParser(description="Writes a synthetic Steamworks SDK")
+    argparser.add_argument("folder")
+    argparser.add_argument("--files", type=int, default=20, help="Number of headers")
+    argparser.add_argument("--scale", type=int, default=50, help="Entities of each kind per header")
+    argparser.add_argument("--seed", type=int, default=0)
+    args = argparser.parse_args()
+
+    write_sdk(args.folder, args.files, args.scale, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import steamworksparser
+
+
+@pytest.fixture(autouse=True)
+def settings():
+    """Restores the Settings flags a test changed"""
+    snapshot = steamworksparser.get_settings()
+    yield steamworksparser.Settings
+    steamworksparser.apply_settings(snapshot)
+
+
+@pytest.fixture
+def write_headers(tmp_path):
+    """Writes a dict of file name -> contents into a folder and returns its path"""
+    def write(headers, folder=None):
+        folder = tmp_path / folder if folder else tmp_path
+        folder.mkdir(exist_ok=True)
+        for name, text in headers.items():
+            (folder / name).write_text(text)
+        return str(folder)
+    return write
+
+
+@pytest.fixture
+def parse_headers(write_headers):
+    """Parses a dict of file name -> contents, extra arguments go to steamworksparser.parse"""
+    def parse(headers, **kwargs):
+        kwargs.setdefault("diagnostics", steamworksparser.Diagnostics(printing=False))
+        return steamworksparser.parse(write_headers(headers), **kwargs)
+    return parse
+
+
+@pytest.fixture
+def synthetic_sdk(tmp_path):
+    """A small syntheticsdk folder"""
+    import syntheticsdk
+    folder = str(tmp_path / "sdk")
+    syntheticsdk.write_sdk(folder, numfiles=3, scale=5, seed=1)
+    return folder
+
+
+def dump_model(parser):
+    """Returns the export_model JSON of a Parser, to compare two models"""
+    import io
+    out = io.StringIO()
+    steamworksparser.export_model(parser, out)
+    return out.getvalue()
@@ -0,0 +1,52 @@
+import math
+import os
+import pickle
+
+import pytest
+
+import steamworksparser
+
+from conftest import dump_model
+
+
+class Overflows:
+    def __reduce__(self):
+        return (math.exp, (1000.0,))
+
+
+@pytest.mark.parametrize("contents", [
+    b"not a pickle",
+    pickle.dumps(Overflows()),
+    pickle.dumps(("a", [])),
+    pickle.dumps((steamworksparser.SteamFile("x.h"), "not a list")),
+    pickle.dumps(["a", "list"]),
+], ids=["garbage", "overflow", "wrong-file", "wrong-diagnostics", "not-a-tuple"])
+def test_bad_entries_are_misses(synthetic_sdk, tmp_path, contents):
+    folder = str(tmp_path / "cache")
+    expected = dump_model(steamworksparser.parse(synthetic_sdk, cache=folder))
+
+    paths = [os.path.join(folder, name) for name in os.listdir(folder)]
+    for path in paths:
+        with open(path, "wb") as out:
+            out.write(contents)
+
+    cache = steamworksparser.ParseCache(folder)
+    assert dump_model(steamworksparser.parse(synthetic_sdk, cache=cache)) == expected
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["misses"] == len(paths)
+
+    # The bad entries were replaced by good ones.
+    cache = steamworksparser.ParseCache(folder)
+    steamworksparser.parse(synthetic_sdk, cache=cache)
+    assert cache.stats()["hits"] == len(paths)
+
+
+def test_bad_entry_is_deleted(tmp_path):
+    cache = steamworksparser.ParseCache(str(tmp_path))
+    path = cache.get_path("key")
+    with open(path, "wb") as out:
+        out.write(pickle.dumps(Overflows()))
+    assert cache.load("key") is None
+    assert not os.path.exists(path)
+    assert cache.load("missing") is None
+    assert cache.stats()["misses"] == 2
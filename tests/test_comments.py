@@ -0,0 +1,58 @@
+import pickle
+
+import pytest
+
+import steamworksparser
+from conftest import dump_model
+
+
+def get_comments(parser):
+    for f in parser.files:
+        for entity in f.defines + f.constants + f.typedefs + f.enums + f.structs + f.callbacks + f.interfaces:
+            yield entity.c
+        for entity in f.enums + f.structs + f.callbacks:
+            for member in entity.fields:
+                yield member.c
+
+
+def count_lazy(parser):
+    return sum(1 for c in get_comments(parser) if isinstance(c, steamworksparser.LazyComment) and c.source is not None)
+
+
+def parse(folder, **kwargs):
+    return steamworksparser.parse(folder, diagnostics=steamworksparser.Diagnostics(printing=False), **kwargs)
+
+
+def test_comments_are_lazy(synthetic_sdk):
+    parser = parse(synthetic_sdk)
+    total = len(list(get_comments(parser)))
+    assert total > 0
+    assert count_lazy(parser) == total
+
+
+def test_pickle_keeps_comments_lazy(synthetic_sdk):
+    parser = parse(synthetic_sdk)
+    f = parser.files[0]
+    copy = pickle.loads(pickle.dumps(f))
+    assert count_lazy(parser) == len(list(get_comments(parser)))
+    assert isinstance(copy.structs[0].c, steamworksparser.LazyComment) and copy.structs[0].c.source is not None
+    assert copy.structs[0].c.precomments == f.structs[0].c.precomments
+
+
+def test_pickle_materialized_comment():
+    c = steamworksparser.LazyComment(steamworksparser.SourceText("// Hello\nint a;\n"), 0, 1)
+    assert c.precomments == [" Hello"]
+    copy = pickle.loads(pickle.dumps(c))
+    assert type(copy) is steamworksparser.Comment
+    assert copy.precomments == [" Hello"]
+
+
+@pytest.mark.parametrize("kwargs", [{"workers": 2}, {"cache": "cache"}])
+def test_workers_and_cache_stay_lazy(synthetic_sdk, tmp_path, kwargs):
+    if "cache" in kwargs:
+        kwargs["cache"] = str(tmp_path / kwargs["cache"])
+        parse(synthetic_sdk, **kwargs)  # Fills the cache
+    parser = parse(synthetic_sdk, **kwargs)
+    total = len(list(get_comments(parser)))
+    assert count_lazy(parser) == total
+    assert dump_model(parser) == dump_model(parse(synthetic_sdk))
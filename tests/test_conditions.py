@@ -0,0 +1,130 @@
+import pytest
+
+import steamworksparser
+
+from conftest import dump_model
+
+HEADER = """#ifndef ISTEAMCOND_H
+#define ISTEAMCOND_H
+
+#define FEATURE_LEVEL 2
+
+#if defined( _WIN32 )
+const int k_nWin = 1;
+#if FEATURE_LEVEL > 1
+const int k_nWinFeature = 1;
+#else
+const int k_nWinNoFeature = 1;
+#endif
+#elif defined __linux__
+const int k_nLinux = 1;
+#elif defined( __APPLE__ ) || defined( POSIX )
+const int k_nPosix = 1;
+#else
+const int k_nOther = 1;
+#endif
+
+#ifdef _WIN32
+#undef FEATURE_LEVEL
+#endif
+
+#ifndef FEATURE_LEVEL
+const int k_nNoFeatureLevel = 1;
+#endif
+
+#if 0
+const int k_nNever = 1;
+#if 1
+const int k_nNeverNested = 1;
+#else
+const int k_nNeverElse = 1;
+#endif
+#endif
+
+#endif // ISTEAMCOND_H
+"""
+
+ALL_CONSTANTS = ["k_nWin", "k_nWinFeature", "k_nWinNoFeature", "k_nLinux", "k_nPosix", "k_nOther",
+                 "k_nNoFeatureLevel", "k_nNever", "k_nNeverNested", "k_nNeverElse"]
+
+
+def get_constants(parser):
+    return [constant.name for f in parser.files for constant in f.constants]
+
+
+@pytest.mark.parametrize("expression, value", [
+    ("defined( _WIN32 )", 1),
+    ("defined _WIN32", 1),
+    ("defined(POSIX)", 0),
+    ("!defined POSIX && _WIN32", 1),
+    ("LEVEL >= 2 && LEVEL < 3", 1),
+    ("UNDEFINED_NAME", 0),
+    ("EMPTY", 0),
+    ("ALIAS + 1", 3),
+])
+def test_condition_evaluator(expression, value):
+    conditions = steamworksparser.ConditionEvaluator({"_WIN32": 1, "LEVEL": 2, "EMPTY": "", "ALIAS": "LEVEL"})
+    assert conditions.evaluate(expression) == value
+
+
+def test_condition_evaluator_define_and_undefine():
+    conditions = steamworksparser.ConditionEvaluator({"_WIN32"})
+    assert conditions.evaluate("defined _WIN32 && FOO == 3") == 0
+    conditions.define("FOO", "3")
+    assert conditions.evaluate("defined _WIN32 && FOO == 3") == 1
+    conditions.undefine("_WIN32")
+    assert conditions.evaluate("defined _WIN32 && FOO == 3") == 0
+
+
+def test_condition_evaluator_errors():
+    conditions = steamworksparser.ConditionEvaluator({"A": "B", "B": "A"})
+    with pytest.raises(steamworksparser.EvaluationError, match="Cycle"):
+        conditions.evaluate("A")
+    with pytest.raises(steamworksparser.EvaluationError):
+        conditions.evaluate("defined")
+
+
+def test_default_parses_every_branch(parse_headers):
+    assert get_constants(parse_headers({"isteamcond.h": HEADER})) == ALL_CONSTANTS
+
+
+@pytest.mark.parametrize("defines, constants", [
+    ({"_WIN32"}, ["k_nWin", "k_nWinFeature", "k_nNoFeatureLevel"]),
+    ({"_WIN32": 1, "FEATURE_LEVEL": 0}, ["k_nWin", "k_nWinFeature", "k_nNoFeatureLevel"]),
+    ({"__linux__"}, ["k_nLinux"]),
+    ({"POSIX"}, ["k_nPosix"]),
+    (set(), ["k_nOther"]),
+])
+def test_defines_pick_branches(parse_headers, settings, defines, constants):
+    settings.defines = defines
+    parser = parse_headers({"isteamcond.h": HEADER})
+    assert get_constants(parser) == constants
+    assert not parser.diagnostics.query(code="condition")
+
+
+def test_unevaluable_condition_is_true(parse_headers, settings):
+    settings.defines = set()
+    parser = parse_headers({"isteamcond.h": "#if ( 1 +\nconst int k_nInside = 1;\n#endif\n"})
+    assert get_constants(parser) == ["k_nInside"]
+    assert len(parser.diagnostics.query(code="condition")) == 1
+
+
+@pytest.mark.parametrize("defines", [None, {"_WIN32"}, {"POSIX"}])
+def test_workers_and_cache_match_serial(write_headers, tmp_path, settings, defines):
+    settings.defines = defines
+    folder = write_headers({"isteamcond.h": HEADER, "isteamother.h": HEADER.replace("ISTEAMCOND_H", "ISTEAMOTHER_H")}, "sdk")
+    expected = dump_model(steamworksparser.parse(folder))
+    assert dump_model(steamworksparser.parse(folder, workers=2)) == expected
+
+    cache = str(tmp_path / "cache")
+    assert dump_model(steamworksparser.parse(folder, cache=cache)) == expected
+    assert dump_model(steamworksparser.parse(folder, cache=cache)) == expected
+
+
+def test_cache_is_keyed_by_defines(write_headers, tmp_path, settings):
+    folder = write_headers({"isteamcond.h": HEADER}, "sdk")
+    cache = str(tmp_path / "cache")
+    settings.defines = {"_WIN32"}
+    steamworksparser.parse(folder, cache=cache)
+    settings.defines = {"POSIX"}
+    assert get_constants(steamworksparser.parse(folder, cache=cache)) == ["k_nPosix"]
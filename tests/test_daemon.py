@@ -0,0 +1,82 @@
+import os
+import socket
+import threading
+
+import pytest
+
+import parsedaemon
+import steamworksparser
+
+from conftest import dump_model
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Needs Unix sockets")
+
+
+@pytest.fixture
+def server(synthetic_sdk, tmp_path):
+    """A ParseServer on the synthetic SDK, running in a thread"""
+    path = str(tmp_path / "sdk.sock")
+    parser = steamworksparser.parse(synthetic_sdk, diagnostics=steamworksparser.Diagnostics(printing=False))
+    server = parsedaemon.ParseServer(parser, path, interval=0.05, requesttimeout=0.5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_core_module_has_no_sockets():
+    assert not hasattr(steamworksparser, "ParseServer")
+    assert "socketserver" not in vars(steamworksparser)
+
+
+def test_load(server):
+    client = parsedaemon.ParseClient(server.server_address, timeout=5)
+    assert dump_model(client.load()) == dump_model(server.parser)
+    interface = server.parser.files[-1].interfaces[0]
+    assert client.get_interface(interface.name).name == interface.name
+    with pytest.raises(parsedaemon.ServerError):
+        client.request("bogus")
+
+
+def test_stalled_client_times_out(server):
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stalled.connect(server.server_address)
+    try:
+        # Without the request timeout this waits on the stalled connection forever.
+        client = parsedaemon.ParseClient(server.server_address, timeout=5)
+        assert client.status()["files"] == [f.name for f in server.parser.files]
+    finally:
+        stalled.close()
+
+
+def test_unparseable_header_keeps_last_model(server, synthetic_sdk):
+    client = parsedaemon.ParseClient(server.server_address, timeout=5)
+    expected = dump_model(client.load())
+    path = synthetic_sdk + "/isteambroken.h"
+    with open(path, "w") as out:
+        out.write("STEAM_CALLBACK_BEGIN(\n")
+
+    status = client.status()
+    assert status["error"].startswith("Couldn't re-parse isteambroken.h: ")
+    assert "isteambroken.h" not in status["files"]
+    assert dump_model(client.load()) == expected
+    assert client.status()["error"] is not None  # Retried, and still broken
+
+    with open(path, "w") as out:
+        out.write("#ifndef ISTEAMBROKEN_H\n#define ISTEAMBROKEN_H\nconst int k_nFixed = 1;\n#endif // ISTEAMBROKEN_H\n")
+    status = client.status()
+    assert status["error"] is None
+    assert "isteambroken.h" in status["files"]
+    assert client.get_file("isteambroken.h").constants[0].name == "k_nFixed"
+
+
+def test_deleted_unparseable_header(server, synthetic_sdk):
+    client = parsedaemon.ParseClient(server.server_address, timeout=5)
+    path = synthetic_sdk + "/isteambroken.h"
+    with open(path, "w") as out:
+        out.write("STEAM_CALLBACK_BEGIN(\n")
+    assert client.status()["error"] is not None
+    os.remove(path)
+    assert client.status()["error"] is None
@@ -0,0 +1,149 @@
+import pytest
+
+import steamworksparser
+
+OLD = """#ifndef ISTEAMTEST_H
+#define ISTEAMTEST_H
+
+#define TEST_VERSION "1"
+#define TEST_MAX 10
+
+typedef unsigned int uint32;
+
+enum ETest
+{
+	k_ETestOne = 1,
+	k_ETestTwo = 2,
+};
+
+class ISteamTest
+{
+public:
+	virtual bool First( int nValue ) = 0;
+	virtual void Second( const char *pchName ) = 0;
+	virtual void Third() = 0;
+	virtual void Removed() = 0;
+};
+
+class ISteamOld
+{
+public:
+	virtual uint32 GetCount() = 0;
+	virtual bool GetItem( uint32 iItem, char *pchName, int cchName ) = 0;
+};
+
+struct Test_t
+{
+	uint32 m_a;
+	int m_b;
+};
+
+#endif // ISTEAMTEST_H
+"""
+
+NEW = """#ifndef ISTEAMTEST_H
+#define ISTEAMTEST_H
+
+#define TEST_VERSION "2"
+#define TEST_MAX 10
+
+typedef unsigned int uint32;
+
+enum ETest
+{
+	k_ETestOne = 1,
+	k_ETestTwo = 2,
+	k_ETestThree = 3,
+};
+
+class ISteamTest
+{
+public:
+	virtual void Second( const char *pchName ) = 0;
+	virtual bool First( int nValue, bool bFlag ) = 0;
+	virtual void Third() = 0;
+	virtual bool Added( int nValue ) = 0;
+};
+
+class ISteamNew
+{
+public:
+	virtual uint32 GetCount() = 0;
+	virtual bool GetItem( uint32 iItem, char *pchName, int cchName ) = 0;
+};
+
+struct Test_t
+{
+	uint32 m_a;
+	uint32 m_b;
+};
+
+#endif // ISTEAMTEST_H
+"""
+
+
+@pytest.fixture
+def changes(write_headers):
+    old = parse_sdk(write_headers, OLD, "old")
+    new = parse_sdk(write_headers, NEW, "new")
+    return steamworksparser.diff_parsers(old, new)
+
+
+def parse_sdk(write_headers, header, folder):
+    diagnostics = steamworksparser.Diagnostics(printing=False)
+    return steamworksparser.parse(write_headers({"isteamtest.h": header}, folder), diagnostics=diagnostics)
+
+
+def get_changes(changes, **kwargs):
+    return sorted((c.kind, c.entity, c.name) for c in changes.query(**kwargs))
+
+
+def test_identical(write_headers):
+    old = parse_sdk(write_headers, OLD, "old")
+    new = parse_sdk(write_headers, OLD, "new")
+    assert len(steamworksparser.diff_parsers(old, new)) == 0
+
+
+def test_functions(changes):
+    assert get_changes(changes, entity="function") == [
+        ("added", "function", "ISteamTest::Added"),
+        ("changed", "function", "ISteamTest::First"),
+        ("moved", "function", "ISteamTest::Second"),
+        ("removed", "function", "ISteamTest::Removed"),
+    ]
+    assert changes.query(kind="changed", entity="function")[0].fields == ("args",)
+    assert get_changes(changes, entity="arg") == [("added", "arg", "ISteamTest::First(bFlag)")]
+
+
+def test_renamed_interface(changes):
+    renamed = changes.query(kind="renamed", entity="interface")
+    assert [(c.old.name, c.name) for c in renamed] == [("ISteamOld", "ISteamNew")]
+    assert not changes.query(name="ISteamOld")
+    assert not changes.query(name="ISteamNew", kind="changed")
+    assert not changes.query(entity="function", name="ISteamNew::GetCount")
+
+
+def test_renamed_function(write_headers):
+    old = parse_sdk(write_headers, OLD, "old")
+    new = parse_sdk(write_headers, OLD.replace("void Removed()", "void Renamed()"), "new")
+    changes = steamworksparser.diff_parsers(old, new)
+    assert [(c.kind, c.name, c.old.name) for c in changes] == [
+        ("changed", "ISteamTest", "ISteamTest"),
+        ("renamed", "ISteamTest::Renamed", "Removed"),
+    ]
+
+
+def test_values(changes):
+    assert [(c.name, c.fields) for c in changes.query(entity="define")] == [("TEST_VERSION", ("value",))]
+    assert get_changes(changes, entity="enumfield") == [("added", "enumfield", "ETest.k_ETestThree")]
+    field = changes.query(entity="field")
+    assert [(c.kind, c.name, c.fields) for c in field] == [("changed", "Test_t.m_b", ("type",))]
+    assert [(c.old.type, c.new.type) for c in field] == [("int", "uint32")]
+
+
+def test_comments_are_ignored_by_default(write_headers):
+    old = parse_sdk(write_headers, OLD, "old")
+    new = parse_sdk(write_headers, OLD.replace("\tuint32 m_a;", "\t// The a\n\tuint32 m_a;"), "new")
+    assert len(steamworksparser.diff_parsers(old, new)) == 0
+    changes = steamworksparser.diff_parsers(old, new, comments=True)
+    assert [(c.kind, c.name) for c in changes.query(entity="field")] == [("changed", "Test_t.m_a")]
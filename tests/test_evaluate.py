@@ -0,0 +1,115 @@
+import pytest
+
+import steamworksparser
+
+HEADER = """#ifndef ISTEAMTEST_H
+#define ISTEAMTEST_H
+
+typedef unsigned int uint32;
+
+#define DIV_NEG (-7/2)
+#define MOD_NEG (-7%2)
+#define CYCLE_A (CYCLE_B+1)
+#define CYCLE_B CYCLE_A
+#define NAME_STRING "hello"
+#define HEX_VALUE 0x1Fu
+
+const int k_iSteamUserCallbacks = 100;
+const int k_cchMax = DIV_NEG * 10;
+const uint32 k_unCast = ( uint32 ) ( k_EThingTen + 1 );
+
+enum EThing
+{
+	k_EThingNone = 0,
+	k_EThingOne,
+	k_EThingTwo,
+	k_EThingTen = 10,
+	k_EThingEleven,
+	k_EThingShifted = 1 << 3,
+};
+
+struct FirstCallback_t
+{
+	enum { k_iCallback = k_iSteamUserCallbacks + 1 };
+	uint32 m_a;
+};
+
+struct SecondCallback_t
+{
+	enum { k_iCallback = k_iSteamUserCallbacks + 1 };
+	uint32 m_b;
+};
+
+STEAM_CALLBACK_BEGIN( MacroCallback_t, k_iSteamUserCallbacks + k_EThingTwo )
+	STEAM_CALLBACK_MEMBER( 0, uint32, m_c )
+STEAM_CALLBACK_END(1)
+
+#endif // ISTEAMTEST_H
+"""
+
+
+@pytest.fixture
+def evaluator(parse_headers):
+    return parse_headers({"isteamtest.h": HEADER}).evaluator
+
+
+@pytest.mark.parametrize("expression, value", [
+    ("7 / 2", 3),
+    ("-7 / 2", -3),
+    ("7 / -2", -3),
+    ("-7 % 3", -1),
+    ("7 % -3", 1),
+    ("7.0 / 2", 3.5),
+    ("(1 + 2) * 3", 9),
+    ("1 << 3 | 1", 9),
+    ("!0 && 2 > 1", 1),
+    ("0x1Fu + 010", 39),
+    ("( unsigned int ) 5", 5),
+    ("( uint32 * ) 0", 0),
+    ("( uint32 ) ( k_EThingTen + 1 )", 11),
+])
+def test_expressions(evaluator, expression, value):
+    assert evaluator.evaluate(expression) == value
+
+
+@pytest.mark.parametrize("expression, message", [
+    ("1 / 0", "division"),
+    ("( 1 + 2", "Missing"),
+    ("k_Missing", "Unknown identifier: k_Missing"),
+    ("", "Empty expression"),
+])
+def test_expression_errors(evaluator, expression, message):
+    with pytest.raises(steamworksparser.EvaluationError, match=message):
+        evaluator.evaluate(expression)
+
+
+def test_values(evaluator):
+    values = evaluator.values
+    assert values["DIV_NEG"] == -3
+    assert values["MOD_NEG"] == -1
+    assert values["HEX_VALUE"] == 31
+    assert values["k_cchMax"] == -30
+    assert values["k_unCast"] == 11
+
+
+def test_implicit_enum_values(evaluator):
+    values = evaluator.values
+    assert [values[name] for name in ("k_EThingNone", "k_EThingOne", "k_EThingTwo")] == [0, 1, 2]
+    assert values["k_EThingTen"] == 10
+    assert values["k_EThingEleven"] == 11
+    assert values["k_EThingShifted"] == 8
+
+
+def test_errors(evaluator):
+    assert evaluator.errors["CYCLE_A"].startswith("Cycle through")
+    assert evaluator.errors["CYCLE_B"].startswith("Cycle through")
+    assert "NAME_STRING" in evaluator.errors
+    with pytest.raises(steamworksparser.EvaluationError):
+        evaluator.get_value("CYCLE_A")
+
+
+def test_callback_ids(evaluator):
+    assert evaluator.callbackids == {"FirstCallback_t": 101, "SecondCallback_t": 101, "MacroCallback_t": 102}
+    assert evaluator.callbacks[101].name == "FirstCallback_t"
+    assert evaluator.callbacks[102].name == "MacroCallback_t"
+    assert evaluator.errors["SecondCallback_t"] == "Callback id 101 is also used by FirstCallback_t"
@@ -0,0 +1,53 @@
+import steamworksparser
+
+INTERFACE = """#ifndef ISTEAMTEST_H
+#define ISTEAMTEST_H
+
+class ISteamTest
+{
+public:
+%s
+};
+
+#endif // ISTEAMTEST_H
+"""
+
+
+def get_functions(parse_headers, body):
+    parser = parse_headers({"isteamtest.h": INTERFACE % body})
+    return parser.files[0].interfaces[0].functions
+
+
+def test_args_and_attributes(parse_headers):
+    functions = get_functions(parse_headers, """
+	STEAM_CALL_RESULT( LobbyCreated_t )
+	virtual SteamAPICall_t CreateLobby( ELobbyType eLobbyType, int cMaxMembers ) = 0;
+	virtual bool GetName( STEAM_OUT_STRING_COUNT( cchName ) char *pchName, int cchName, const char *pchDefault = NULL ) = 0;
+""")
+    create, get = functions
+    assert (create.name, create.returntype) == ("CreateLobby", "SteamAPICall_t")
+    assert [(a.name, a.value) for a in create.attributes] == [("STEAM_CALL_RESULT", "LobbyCreated_t")]
+    assert [(a.type, a.name) for a in create.args] == [("ELobbyType", "eLobbyType"), ("int", "cMaxMembers")]
+
+    assert [(a.type, a.name, a.default) for a in get.args] == [
+        ("char *", "pchName", None), ("int", "cchName", None), ("const char *", "pchDefault", "NULL")]
+    assert (get.args[0].attribute.name, get.args[0].attribute.value) == ("STEAM_OUT_STRING_COUNT", "cchName")
+
+
+def test_apostrophe_in_method_description(parse_headers):
+    functions = get_functions(parse_headers, """
+	STEAM_METHOD_DESC(Don't call this (ever) from a thread)
+	virtual void Foo() = 0;
+""")
+    assert functions[0].attributes[0].value == "Don't call this (ever) from a thread"
+
+
+def test_apostrophe_in_arg_description(parse_headers):
+    functions = get_functions(parse_headers, """
+	virtual void Foo( STEAM_DESC(Doesn't matter) uint32 unValue, int nOther ) = 0;
+	virtual void Bar( int nBar ) = 0;
+""")
+    assert [f.name for f in functions] == ["Foo", "Bar"]
+    assert [a.name for a in functions[0].args] == ["unValue", "nOther"]
+    assert functions[0].args[0].attribute.value == "Doesn'tmatter"
+    assert [a.name for a in functions[1].args] == ["nBar"]
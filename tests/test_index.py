@@ -0,0 +1,51 @@
+import io
+
+import steamworksparser
+
+HEADER = """#ifndef STEAMTEST_H
+#define STEAMTEST_H
+
+class ISteamTest;
+class CForward;
+
+class CSteamID
+{
+public:
+	CSteamID();
+};
+
+class CGameID : public CBase
+{
+};
+
+class ISteamTest
+{
+public:
+	virtual void Foo() = 0;
+};
+
+struct Test_t
+{
+	int m_a;
+};
+
+#endif // STEAMTEST_H
+"""
+
+
+def test_get_file(parse_headers):
+    parser = parse_headers({"steamtest.h": HEADER, "other.h": "#ifndef OTHER_H\n#define OTHER_H\n#endif // OTHER_H\n"})
+    f = parser.index.files["steamtest.h"]
+    assert f.classes == ["CSteamID", "CGameID"]
+    for name in ("CSteamID", "CGameID", "ISteamTest", "Foo", "Test_t"):
+        assert parser.index.get_file(name) is f
+    assert parser.index.get_file("CForward") is None
+    assert parser.index.get_file("CMissing") is None
+
+
+def test_classes_are_exported(parse_headers):
+    parser = parse_headers({"steamtest.h": HEADER})
+    out = io.StringIO()
+    steamworksparser.export_model(parser, out)
+    loaded = steamworksparser.load_model(io.StringIO(out.getvalue()))
+    assert loaded.index.get_file("CSteamID").name == "steamtest.h"
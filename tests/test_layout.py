@@ -0,0 +1,115 @@
+import pytest
+
+HEADER = """#ifndef ISTEAMTEST_H
+#define ISTEAMTEST_H
+
+typedef unsigned int uint32;
+typedef unsigned long long uint64;
+
+#if defined( VALVE_CALLBACK_PACK_SMALL )
+#pragma pack( push, 4 )
+#elif defined( VALVE_CALLBACK_PACK_LARGE )
+#pragma pack( push, 8 )
+#else
+#error steam_api_common.h should define VALVE_CALLBACK_PACK_xxx
+#endif
+
+struct Test_t
+{
+	uint32 a;
+	uint64 b;
+};
+
+#pragma pack( pop )
+
+struct After_t
+{
+	int m_a;
+	double m_d;
+};
+
+#endif // ISTEAMTEST_H
+"""
+
+
+@pytest.mark.parametrize("abi, size, offset", [
+    ("win32", 16, 8),
+    ("win64", 16, 8),
+    ("linux32", 12, 4),
+    ("linux64", 12, 4),
+    ("macos64", 12, 4),
+])
+def test_callback_pack_follows_abi(parse_headers, abi, size, offset):
+    parser = parse_headers({"isteamtest.h": HEADER})
+    layout = parser.get_layout_engine(abi).get_layout(parser.index.structs["Test_t"])
+    assert (layout.size, layout.fields[1].offset) == (size, offset)
+
+
+def test_pack_conditions(parse_headers):
+    struct = parse_headers({"isteamtest.h": HEADER}).index.structs["Test_t"]
+    assert struct.packsize == [4, 8]
+    assert struct.packconditions == [
+        "(defined( VALVE_CALLBACK_PACK_SMALL ))",
+        "(!(defined( VALVE_CALLBACK_PACK_SMALL )) && (defined( VALVE_CALLBACK_PACK_LARGE )))",
+    ]
+
+
+def test_configured_parse_keeps_one_push(parse_headers, settings):
+    settings.defines = ["VALVE_CALLBACK_PACK_SMALL"]
+    parser = parse_headers({"isteamtest.h": HEADER})
+    struct = parser.index.structs["Test_t"]
+    assert struct.packsize == [4]
+    assert parser.get_layout_engine("linux64").get_layout(struct).size == 12
+
+
+@pytest.mark.parametrize("abi", ["win32", "win64", "linux32", "linux64", "macos64"])
+def test_pop_ends_every_branch_push(parse_headers, abi):
+    parser = parse_headers({"isteamtest.h": HEADER})
+    struct = parser.index.structs["After_t"]
+    assert struct.packsize == []
+    layout = parser.get_layout_engine(abi).get_layout(struct)
+    if abi == "linux32":
+        assert (layout.size, [f.offset for f in layout.fields]) == (12, [0, 4])
+    else:
+        assert (layout.size, [f.offset for f in layout.fields]) == (16, [0, 8])
+
+
+def test_pop_keeps_enclosing_push(parse_headers):
+    parser = parse_headers({"isteamtest.h": """#pragma pack( push, 2 )
+#if defined( A )
+#if defined( B )
+#pragma pack( push, 4 )
+#else
+#pragma pack( push, 8 )
+#endif
+#else
+#pragma pack( push, 1 )
+#endif
+#if defined( C )
+#pragma pack( push, 16 )
+#endif
+struct Inside_t
+{
+	int m_a;
+};
+#pragma pack( pop )
+struct AfterFirst_t
+{
+	int m_a;
+};
+#pragma pack( pop )
+struct AfterSecond_t
+{
+	int m_a;
+};
+#pragma pack( pop )
+struct Outside_t
+{
+	int m_a;
+};
+"""})
+    structs = parser.index.structs
+    assert structs["Inside_t"].packsize == [2, 4, 8, 1, 16]
+    assert structs["AfterFirst_t"].packsize == [2, 4, 8, 1]
+    assert structs["AfterSecond_t"].packsize == [2]
+    assert structs["Outside_t"].packsize == []
@@ -0,0 +1,30 @@
+import pytest
+
+import steamworksparser
+
+from conftest import dump_model
+
+HEADER = """#ifndef ISTEAMTEST_H
+#define ISTEAMTEST_H
+
+#line 10
+#line 10
+
+const int k_nValue = 1;
+
+#endif // ISTEAMTEST_H
+"""
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_diagnostic_counts(write_headers, tmp_path, settings, cache):
+    settings.print_diagnostics = False
+    folders = [write_headers({"isteamtest.h": HEADER}, name) for name in ("a", "b", "c")]
+    expected = steamworksparser.parse(folders[0])
+    assert [(d.code, d.count) for d in expected.diagnostics.records] == [("preprocessor", 2)]
+
+    parsers = steamworksparser.parse_many(folders, cache=str(tmp_path / "cache") if cache else None)
+    for parser in parsers:
+        assert [(d.code, d.count) for d in parser.diagnostics.records] == [("preprocessor", 2)]
+        assert parser.diagnostics.counts == {"preprocessor": 2}
+        assert dump_model(parser) == dump_model(expected)
@@ -0,0 +1,48 @@
+import pytest
+
+import steamworksparser
+
+
+def get_tokens(line):
+    return [(token.kind, token.text) for token in steamworksparser.tokenize(line)]
+
+
+def test_expression():
+    line = "( uint32 ) ( k_iSteamUserCallbacks + 0x1Fu ) * -2"
+    assert get_tokens(line) == [
+        ("punctuation", "("), ("identifier", "uint32"), ("punctuation", ")"), ("punctuation", "("),
+        ("identifier", "k_iSteamUserCallbacks"), ("punctuation", "+"), ("number", "0x1Fu"),
+        ("punctuation", ")"), ("punctuation", "*"), ("punctuation", "-"), ("number", "2"),
+    ]
+
+
+def test_positions():
+    tokens = steamworksparser.tokenize("  a  +\tbc", 7)
+    assert [(token.text, token.pos, token.linenum) for token in tokens] == [("a", 2, 7), ("+", 5, 7), ("bc", 7, 7)]
+
+
+@pytest.mark.parametrize("line, tokens", [
+    ("a&&b==c||!d", [("identifier", "a"), ("punctuation", "&&"), ("identifier", "b"), ("punctuation", "=="),
+                     ("identifier", "c"), ("punctuation", "||"), ("punctuation", "!"), ("identifier", "d")]),
+    ("1<<3>=2!=1", [("number", "1"), ("punctuation", "<<"), ("number", "3"), ("punctuation", ">="),
+                    ("number", "2"), ("punctuation", "!="), ("number", "1")]),
+    ("x.y", [("identifier", "x"), ("punctuation", "."), ("identifier", "y")]),
+    ("1.5f .5 1e3", [("number", "1.5f"), ("number", ".5"), ("number", "1e3")]),
+    ("a / b", [("identifier", "a"), ("punctuation", "/"), ("identifier", "b")]),
+])
+def test_operators_and_numbers(line, tokens):
+    assert get_tokens(line) == tokens
+
+
+def test_strings():
+    assert get_tokens('"a \\" b" \'c\'') == [("string", '"a \\" b"'), ("string", "'c'")]
+    assert get_tokens("L\"w\"") == [("identifier", "L"), ("string", '"w"')]
+
+
+def test_unterminated_string_is_punctuation():
+    assert get_tokens("Don't") == [("identifier", "Don"), ("punctuation", "'"), ("identifier", "t")]
+
+
+def test_empty():
+    assert steamworksparser.tokenize("") == []
+    assert steamworksparser.tokenize("   \t") == []